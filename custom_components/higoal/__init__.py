@@ -7,91 +7,230 @@ https://github.com/ludeeus/integration_blueprint
 
 from __future__ import annotations
 
+import asyncio
+from datetime import timedelta
 from typing import TYPE_CHECKING
 
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME, Platform
+from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers import device_registry as dr
-from homeassistant.helpers.dispatcher import dispatcher_send
+from homeassistant.helpers.event import async_track_time_interval
 
-from .client.device import Entity, Device
-from .client.manager import Manager, EntityListener
-from .const import DOMAIN, logger, HIGOAL_HA_SIGNAL_UPDATE_ENTITY, HIGOAL_DISCOVERY_NEW
+from .const import (
+    CONF_API_PORT,
+    CONF_BATCH_INTERVAL,
+    CONF_BROKER_CONNECTIONS,
+    CONF_BROKER_PORT,
+    CONF_BUFFER_SIZE,
+    CONF_DAEMON_SOCKET,
+    CONF_HOST,
+    CONF_OFFLINE_AFTER_FRAMES,
+    CONF_OFFLINE_AFTER_SECONDS,
+    CONF_OFFLINE_PROBE_INTERVAL,
+    CONF_RETRY_INTERVAL,
+    CONF_TOKEN_MAX_AGE,
+    CONF_TRACE_DEVICES,
+    CONF_TRACE_SAMPLE_RATE,
+    DEFAULT_API_PORT,
+    DEFAULT_BATCH_INTERVAL,
+    DEFAULT_BROKER_CONNECTIONS,
+    DEFAULT_BROKER_PORT,
+    DEFAULT_BUFFER_SIZE,
+    DEFAULT_DAEMON_SOCKET,
+    DEFAULT_HOST,
+    DEFAULT_OFFLINE_AFTER_FRAMES,
+    DEFAULT_OFFLINE_AFTER_SECONDS,
+    DEFAULT_OFFLINE_PROBE_INTERVAL,
+    DEFAULT_RETRY_INTERVAL,
+    DEFAULT_TOKEN_MAX_AGE,
+    DEFAULT_TRACE_SAMPLE_RATE,
+    DEVICE_SYNC_INTERVAL,
+    DOMAIN,
+    STALE_REFRESH_INTERVAL,
+    UNLOAD_TIMEOUT,
+    logger,
+)
 from .data import IntegrationData
+from .services import async_setup_services
+from .store import StatusStore, TravelTimeStore
 
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import HomeAssistant
 
 from .data import HigoalConfigEntry
 
+if TYPE_CHECKING:
+    from .client.manager import Manager
+    from .listener import HomeAssistantEntityListener
+
 PLATFORMS: list[Platform] = [Platform.SWITCH, Platform.LIGHT, Platform.COVER]
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 
 
-class HomeAssistantEntityListener(EntityListener):
+async def async_setup(hass: HomeAssistant, config: dict) -> bool:
+    """Set up the higoal services."""
+    async_setup_services(hass)
+    return True
 
-    def __init__(self, hass: HomeAssistant):
-        self.hass = hass
 
-    def on_entity_changed(self, entity: Entity):
-        dispatcher_send(
-            self.hass,
-            f"{HIGOAL_HA_SIGNAL_UPDATE_ENTITY}_{entity.device.id}",
-            [],
-        )
+def _load_client() -> tuple[type[Manager], type[HomeAssistantEntityListener]]:
+    """Import the client stack (requests, sockets, protocol tables) on first use only."""
+    from .client.manager import Manager
+    from .listener import HomeAssistantEntityListener
 
-    def on_device_added(self, device: Device):
-        self.hass.add_job(self.async_remove_device, device.id)
+    return Manager, HomeAssistantEntityListener
 
-        dispatcher_send(self.hass, HIGOAL_DISCOVERY_NEW, [device.identifier])
 
-    def on_device_removed(self, device: Device) -> None:
-        """Add device removed listener."""
-        self.hass.add_job(self.async_remove_device, device.id)
+async def async_setup_entry(hass: HomeAssistant, entry: HigoalConfigEntry) -> bool:
+    """Async setup hass config entry."""
+    Manager, HomeAssistantEntityListener = await hass.async_add_import_executor_job(
+        _load_client
+    )
+
+    status_store = StatusStore(hass, entry.entry_id)
+    travel_times = TravelTimeStore(hass, entry.entry_id)
+    await travel_times.async_load()
+    device_listener = HomeAssistantEntityListener(hass, status_store)
 
-    @callback
-    def async_remove_device(self, device_id: str) -> None:
-        """Remove device from Home Assistant."""
-        device_registry = dr.async_get(self.hass)
-        device_entry = device_registry.async_get_device(
-            identifiers={(DOMAIN, device_id)}
+    manager = hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
+    if manager is not None:
+        # Hot reload: the live connection, devices and state were kept
+        manager.entity_listener = device_listener
+        manager.apply_tuning(**_tuning(entry))
+    else:
+        manager = Manager(
+            domain=entry.options.get(CONF_HOST, DEFAULT_HOST),
+            port=entry.options.get(CONF_API_PORT, DEFAULT_API_PORT),
+            broker_port=entry.options.get(CONF_BROKER_PORT, DEFAULT_BROKER_PORT),
+            username=entry.data[CONF_USERNAME],
+            password=entry.data[CONF_PASSWORD],
+            entity_listener=device_listener,
+            daemon_socket=entry.options.get(CONF_DAEMON_SOCKET, DEFAULT_DAEMON_SOCKET) or None,
+            broker_connections=entry.options.get(CONF_BROKER_CONNECTIONS, DEFAULT_BROKER_CONNECTIONS),
+            **_tuning(entry),
         )
-        if device_entry is not None:
-            device_registry.async_remove_device(device_entry.id)
 
+        # Get all devices
+        await hass.async_add_executor_job(manager.get_devices)
 
-async def async_setup_entry(hass: HomeAssistant, entry: HigoalConfigEntry) -> bool:
-    """Async setup hass config entry."""
+        # Seed the last known state so entities do not start out empty
+        await status_store.async_restore(manager)
 
-    device_listener = HomeAssistantEntityListener(hass)
-    manager = Manager(
-        username=entry.data[CONF_USERNAME],
-        password=entry.data[CONF_PASSWORD],
-        entity_listener=device_listener
+    # Connection is successful, store the manager & listener
+    entry.runtime_data = IntegrationData(
+        manager=manager,
+        listener=device_listener,
+        status_store=status_store,
+        travel_times=travel_times,
+        connection_config=_connection_config(entry),
     )
 
-    # Get all devices
-    await hass.async_add_executor_job(manager.get_devices)
+    try:
+        device_registry = dr.async_get(hass)
+        for device in manager.device_map.values():
+            device_registry.async_get_or_create(
+                config_entry_id=entry.entry_id,
+                identifiers={(DOMAIN, device.id)},
+                manufacturer="HIGOAL",
+                name=device.name,
+                model=device.model_name,
+                sw_version=device.version
+            )
 
-    # Connection is successful, store the manager & listener
-    entry.runtime_data = IntegrationData(manager=manager, listener=device_listener)
+        _configure_tracing(hass, entry, manager)
 
-    device_registry = dr.async_get(hass)
-    for device in manager.device_map.values():
-        device_registry.async_get_or_create(
-            config_entry_id=entry.entry_id,
-            identifiers={(DOMAIN, device.id)},
-            manufacturer="HIGOAL",
-            name=device.name,
-            model=device.model_name,
-            sw_version=device.version
+        # Notify platforms of setup
+        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    except BaseException:
+        # A failed setup is never unloaded, so nothing else would stop a running (parked) connection
+        await _async_stop(hass, manager)
+        raise
+
+    # Connect the broker in the background; entities start from the restored state
+    # and pick up live updates once the connection is authenticated.
+    if not manager.is_started:
+        entry.async_create_background_task(
+            hass, _async_connect(hass, manager), f"{DOMAIN}_connect_{entry.entry_id}"
         )
 
-    # Notify platforms of setup
-    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    async def _async_sync_devices(_now) -> None:
+        await _async_sync(hass, entry.runtime_data.manager)
 
-    # start background listener
-    await hass.async_add_executor_job(manager.refresh)
+    entry.async_on_unload(
+        async_track_time_interval(hass, _async_sync_devices, DEVICE_SYNC_INTERVAL, cancel_on_shutdown=True)
+    )
+
+    async def _async_refresh_stale_devices(_now) -> None:
+        manager = entry.runtime_data.manager
+        await hass.async_add_executor_job(manager.refresh_stale_devices)
+        # Rotate the token on a new connection before the old one stops working
+        await hass.async_add_executor_job(manager.refresh_expired_token)
+
+    entry.async_on_unload(
+        async_track_time_interval(
+            hass, _async_refresh_stale_devices, STALE_REFRESH_INTERVAL, cancel_on_shutdown=True
+        )
+    )
+
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     return True
 
 
+async def _async_connect(hass: HomeAssistant, manager: Manager) -> None:
+    await hass.async_add_executor_job(manager.refresh)
+
+
+async def _async_sync(hass: HomeAssistant, manager: Manager) -> None:
+    """Pick up added, changed and removed devices; unchanged devices are not touched."""
+    try:
+        await hass.async_add_executor_job(manager.sync_devices)
+    except Exception as e:  # the cloud may be unreachable, the next run retries
+        logger.warning("Failed to refresh the device list: %s", e)
+
+
+def _connection_config(entry: HigoalConfigEntry) -> dict:
+    """Settings that can only be applied by building a new Manager and connection."""
+    return {
+        CONF_USERNAME: entry.data[CONF_USERNAME],
+        CONF_PASSWORD: entry.data[CONF_PASSWORD],
+        CONF_HOST: entry.options.get(CONF_HOST, DEFAULT_HOST),
+        CONF_API_PORT: entry.options.get(CONF_API_PORT, DEFAULT_API_PORT),
+        CONF_BROKER_PORT: entry.options.get(CONF_BROKER_PORT, DEFAULT_BROKER_PORT),
+        CONF_BROKER_CONNECTIONS: entry.options.get(CONF_BROKER_CONNECTIONS, DEFAULT_BROKER_CONNECTIONS),
+        CONF_DAEMON_SOCKET: entry.options.get(CONF_DAEMON_SOCKET, DEFAULT_DAEMON_SOCKET),
+    }
+
+
+def _tuning(entry: HigoalConfigEntry) -> dict:
+    """Settings a running Manager picks up without reconnecting, see Manager.apply_tuning."""
+    options = entry.options
+    return {
+        "retry_interval": options.get(CONF_RETRY_INTERVAL, DEFAULT_RETRY_INTERVAL),
+        "batch_interval": options.get(CONF_BATCH_INTERVAL, DEFAULT_BATCH_INTERVAL),
+        "buffer_size": options.get(CONF_BUFFER_SIZE, DEFAULT_BUFFER_SIZE),
+        "token_max_age": timedelta(minutes=options.get(CONF_TOKEN_MAX_AGE, DEFAULT_TOKEN_MAX_AGE)),
+        "offline_probe_interval": options.get(CONF_OFFLINE_PROBE_INTERVAL, DEFAULT_OFFLINE_PROBE_INTERVAL),
+        "offline_after_frames": options.get(CONF_OFFLINE_AFTER_FRAMES, DEFAULT_OFFLINE_AFTER_FRAMES),
+        "offline_after_seconds": options.get(CONF_OFFLINE_AFTER_SECONDS, DEFAULT_OFFLINE_AFTER_SECONDS),
+    }
+
+
+def _configure_tracing(hass: HomeAssistant, entry: HigoalConfigEntry, manager: Manager) -> None:
+    """Apply the frame tracing options, mapping the selected registry devices to Higoal device ids."""
+    device_registry = dr.async_get(hass)
+    selected = entry.options.get(CONF_TRACE_DEVICES)
+    device_ids = []
+    for registry_id in selected or []:
+        if (registry_device := device_registry.async_get(registry_id)) is None:
+            continue
+        device_ids.extend(
+            identifier for domain, identifier in registry_device.identifiers if domain == DOMAIN
+        )
+    manager.configure_tracing(
+        entry.options.get(CONF_TRACE_SAMPLE_RATE, DEFAULT_TRACE_SAMPLE_RATE),
+        device_ids if selected else None,
+    )
+
+
 async def async_unload_entry(
         hass: HomeAssistant,
         entry: HigoalConfigEntry,
@@ -99,15 +238,43 @@ async def async_unload_entry(
     """Handle removal of an entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
         runtime_data = entry.runtime_data
-        if runtime_data.manager.mq is not None:
-            runtime_data.manager.mq.stop()
+        await runtime_data.status_store.async_save(runtime_data.manager)
+        await runtime_data.travel_times.async_save()
+        if entry.entry_id in hass.data.get(DOMAIN, {}):
+            # Parked for a hot reload, keep it running
+            return unload_ok
+
+        await _async_stop(hass, runtime_data.manager)
     return unload_ok
 
 
+async def _async_stop(hass: HomeAssistant, manager: Manager) -> None:
+    try:
+        async with asyncio.timeout(UNLOAD_TIMEOUT):
+            await hass.async_add_executor_job(manager.stop, UNLOAD_TIMEOUT)
+    except TimeoutError:
+        logger.warning("Connection did not shut down within %s seconds", UNLOAD_TIMEOUT)
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: HigoalConfigEntry) -> None:
+    """Remove the persisted state of a deleted entry."""
+    if (manager := hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)) is not None:
+        await _async_stop(hass, manager)
+    await StatusStore(hass, entry.entry_id).async_remove()
+    await TravelTimeStore(hass, entry.entry_id).async_remove()
+
+
 async def async_reload_entry(
         hass: HomeAssistant,
         entry: HigoalConfigEntry,
 ) -> None:
-    """Reload config entry."""
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    """Reload config entry, keeping the live connection unless the change requires a new one."""
+    runtime_data = entry.runtime_data
+    if _connection_config(entry) == runtime_data.connection_config:
+        hass.data.setdefault(DOMAIN, {})[entry.entry_id] = runtime_data.manager
+    try:
+        await hass.config_entries.async_reload(entry.entry_id)
+    finally:
+        # Still parked if the entry was not set up again (e.g. it was disabled meanwhile)
+        if (manager := hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)) is not None:
+            await _async_stop(hass, manager)
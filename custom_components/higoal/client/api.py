@@ -1,5 +1,10 @@
 from datetime import datetime, timedelta, timezone
-import requests
+from typing import TYPE_CHECKING
+
+from .transport import HttpClient
+
+if TYPE_CHECKING:
+    import requests
 
 UTC = timezone.utc  # keep using UTC for timestamps
 _TOKEN_MAX_AGE = timedelta(hours=1)  # validity window
@@ -11,14 +16,20 @@ class Api:
                  version: str = "V3.21.1",
                  username: str | None = None,
                  password: str | None = None,
-                 session: requests.Session | None = None):
-        self.session = session or requests.Session()
+                 session: "requests.Session | None" = None,
+                 token_max_age: timedelta = _TOKEN_MAX_AGE,
+                 http: HttpClient | None = None):
+        if http is None:
+            http = HttpClient(session)
+        self.http = http
+        self.session = http.session
         self._username = username
         self._password = password
         self._version = version
         self._domain = domain
         self._port = port
         self.url = f"https://{domain}:{port}"
+        self.token_max_age = token_max_age
 
         self.user_id: str | None = None
         self.token: str | None = None
@@ -30,9 +41,14 @@ class Api:
         return (
                 self.token is not None
                 and self._sign_in_time is not None
-                and datetime.now(UTC) - self._sign_in_time > _TOKEN_MAX_AGE
+                and datetime.now(UTC) - self._sign_in_time > self.token_max_age
         )
 
+    @property
+    def token_expired(self) -> bool:
+        """Whether the token is older than `token_max_age` and should be rotated."""
+        return self._token_expired()
+
     @property
     def is_signed_in(self) -> bool:
         """Check that we are logged in and the token is still fresh."""
@@ -57,7 +73,7 @@ class Api:
         )
         headers = {"content-type": "application/x-www-form-urlencoded; charset=utf-8"}
 
-        response = self.session.request(
+        response = self.http.request(
             "POST", f"{self.url}/login", data=payload, headers=headers
         )
         body = response.json()
@@ -82,9 +98,10 @@ class AsyncApi(Api):
                  version: str = "V3.21.1",
                  username: str | None = None,
                  password: str | None = None,
-                 session=None):
-        super().__init__(domain, port, version, username, password, session)
-        self.session = session
+                 session=None,
+                 token_max_age: timedelta = _TOKEN_MAX_AGE,
+                 http: HttpClient | None = None):
+        super().__init__(domain, port, version, username, password, session, token_max_age, http)
 
     async def sign_in(self) -> None:
         """Log in (again) if we are not signed‑in or the token is stale."""
@@ -96,7 +113,7 @@ class AsyncApi(Api):
         )
         headers = {"content-type": "application/x-www-form-urlencoded; charset=utf-8"}
 
-        response = await self.session.post(f"{self.url}/login", data=payload, headers=headers)
+        response = await self.http.async_request("POST", f"{self.url}/login", data=payload, headers=headers)
         body = await response.json()
 
         self.user_id = body.get("repData", {}).get("uid")
@@ -0,0 +1,170 @@
+"""
+Vectorised decoding of recorded frame captures.
+
+A capture is the raw byte stream read from the broker socket, i.e. 48-byte frames
+back to back. The whole buffer is viewed as an (N, 48) uint8 array and every step
+(classification, identifiers, button status/percentage, checksums) runs as a
+column operation, so millions of frames decode in one pass.
+
+This module is meant for offline analysis and needs numpy, which the integration
+itself does not depend on.
+"""
+
+from dataclasses import dataclass
+
+try:
+    import numpy as np
+except ImportError as err:  # pragma: no cover
+    raise ImportError("client.capture requires numpy (pip install numpy)") from err
+
+from .device import (
+    _FALLBACK_PERCENTAGE_OFFSET,
+    _PERCENTAGE_FLAG_OFFSET,
+    _PERCENTAGE_OFFSET,
+    _STATUS_OFFSET,
+)
+from .mq import MESSAGE_SIZE, PING_HEADER, PING_IDENTIFIER, STATUS_HEADER, STATUS_IDENTIFIER
+from .utils import ChecksumHandler
+
+FRAME_OTHER = 0
+FRAME_STATUS = 1
+FRAME_PING = 2
+
+MAX_BUTTONS = 8
+CHECKSUM_START = 2
+CHECKSUM_END = 20
+CHECKSUM_SECRETS = (28, 122)  # see ChecksumHandler.get_checksum
+
+_CHECKSUM_TABLES = None
+
+
+@dataclass(frozen=True)
+class DeviceTimeline:
+    """Columnar state history of one device, one row per status frame (oldest first)."""
+
+    identifier: tuple[int, int, int, int]
+    frame_index: "np.ndarray"  # (n,) position of each row in the capture
+    timestamp: "np.ndarray | None"  # (n,) when timestamps were supplied
+    status: "np.ndarray"  # (n, MAX_BUTTONS) uint8 status byte per button
+    percentage: "np.ndarray"  # (n, MAX_BUTTONS) float, see Entity.percentage
+
+    def __len__(self) -> int:
+        return len(self.frame_index)
+
+
+def as_frames(buffer: "bytes | bytearray | memoryview | np.ndarray") -> "np.ndarray":
+    """View a capture buffer as an (N, 48) uint8 array without copying. A trailing partial frame is ignored."""
+    data = np.frombuffer(buffer, dtype=np.uint8) if not isinstance(buffer, np.ndarray) else buffer.reshape(-1)
+    usable = len(data) - len(data) % MESSAGE_SIZE
+    return data[:usable].reshape(-1, MESSAGE_SIZE)
+
+
+def classify(frames: "np.ndarray") -> "np.ndarray":
+    """Frame kind per row: FRAME_STATUS, FRAME_PING or FRAME_OTHER."""
+    kinds = np.full(len(frames), FRAME_OTHER, dtype=np.uint8)
+    kinds[(frames[:, 0] == STATUS_HEADER[0]) & (frames[:, 1] == STATUS_HEADER[1])] = FRAME_STATUS
+    kinds[(frames[:, 0] == PING_HEADER[0]) & (frames[:, 1] == PING_HEADER[1])] = FRAME_PING
+    return kinds
+
+
+def identifiers(frames: "np.ndarray", kinds: "np.ndarray | None" = None) -> "np.ndarray":
+    """
+    Device identifier per row packed into a uint32 (byte order as in Message.device_identifier),
+    0 for frames that carry none.
+    """
+    if kinds is None:
+        kinds = classify(frames)
+    packed = np.zeros(len(frames), dtype=np.uint32)
+    for kind, columns in ((FRAME_STATUS, STATUS_IDENTIFIER), (FRAME_PING, PING_IDENTIFIER)):
+        mask = kinds == kind
+        packed[mask] = np.ascontiguousarray(frames[mask, columns]).view("<u4").reshape(-1)
+    return packed
+
+
+def unpack_identifier(packed: int) -> tuple[int, int, int, int]:
+    return tuple(int(packed).to_bytes(4, "little"))
+
+
+def statuses(frames: "np.ndarray", buttons: int = MAX_BUTTONS) -> "np.ndarray":
+    """Status byte of every button, (N, buttons)."""
+    return frames[:, _STATUS_OFFSET:_STATUS_OFFSET + buttons]
+
+
+def percentages(frames: "np.ndarray", buttons: int = MAX_BUTTONS) -> "np.ndarray":
+    """Percentage (0.0-1.0) of every button, decoded exactly like EntityState.decode."""
+    base = _STATUS_OFFSET
+    flags = frames[:, base + _PERCENTAGE_FLAG_OFFSET:base + _PERCENTAGE_FLAG_OFFSET + buttons]
+    reported = frames[:, base + _PERCENTAGE_OFFSET:base + _PERCENTAGE_OFFSET + buttons]
+    fallback = frames[:, base + _FALLBACK_PERCENTAGE_OFFSET:base + _FALLBACK_PERCENTAGE_OFFSET + buttons]
+    values = np.where(flags != 0, reported, fallback)
+    return np.minimum(values, 100) / 100
+
+
+def checksums(frames: "np.ndarray", start: int = CHECKSUM_START, end: int = CHECKSUM_END) -> "np.ndarray":
+    """The two checksum bytes of every row, (N, 2), as ChecksumHandler.get_checksum computes them."""
+    global _CHECKSUM_TABLES
+    if _CHECKSUM_TABLES is None:
+        _CHECKSUM_TABLES = [
+            np.array(ChecksumHandler.lookup_table(secret), dtype=np.uint8) for secret in CHECKSUM_SECRETS
+        ]
+
+    result = np.empty((len(frames), len(_CHECKSUM_TABLES)), dtype=np.uint8)
+    for column, table in enumerate(_CHECKSUM_TABLES):
+        checksum = np.zeros(len(frames), dtype=np.uint8)
+        for index in range(start, end + 1):
+            checksum = table[checksum ^ frames[:, index]]
+        result[:, column] = checksum
+    return result
+
+
+def verify_checksums(frames: "np.ndarray", start: int = CHECKSUM_START, end: int = CHECKSUM_END) -> "np.ndarray":
+    """Boolean mask of the rows whose trailing two bytes match their checksum."""
+    return np.all(checksums(frames, start, end) == frames[:, -2:], axis=1)
+
+
+def decode(buffer, timestamps=None, changes_only: bool = True,
+           buttons: int = MAX_BUTTONS) -> dict[tuple[int, int, int, int], DeviceTimeline]:
+    """
+    Decode a capture into per-device state timelines.
+
+    `timestamps` optionally holds one arrival time per frame. With `changes_only`, rows that repeat the previous
+    state of the same device are dropped, which mirrors what Device.set_current_status_response reports.
+    """
+    frames = as_frames(buffer)
+    if timestamps is not None:
+        timestamps = np.asarray(timestamps)[:len(frames)]
+
+    kinds = classify(frames)
+    frame_index = np.flatnonzero(kinds == FRAME_STATUS)
+    status_frames = frames[frame_index]
+    ids = identifiers(status_frames, kinds[frame_index])
+    status = statuses(status_frames, buttons)
+    percentage = percentages(status_frames, buttons)
+
+    # Stable sort keeps every device's rows in capture order.
+    order = np.argsort(ids, kind="stable")
+    ids, frame_index, status, percentage = ids[order], frame_index[order], status[order], percentage[order]
+
+    if changes_only and len(ids):
+        same_device = np.concatenate(([False], ids[1:] == ids[:-1]))
+        same_state = np.concatenate((
+            [False],
+            np.all(status[1:] == status[:-1], axis=1) & np.all(percentage[1:] == percentage[:-1], axis=1),
+        ))
+        keep = ~(same_device & same_state)
+        ids, frame_index, status, percentage = ids[keep], frame_index[keep], status[keep], percentage[keep]
+
+    timelines = {}
+    boundaries = np.flatnonzero(np.diff(ids)) + 1
+    for rows in np.split(np.arange(len(ids)), boundaries):
+        if not len(rows):
+            continue
+        identifier = unpack_identifier(ids[rows[0]])
+        timelines[identifier] = DeviceTimeline(
+            identifier=identifier,
+            frame_index=frame_index[rows],
+            timestamp=timestamps[frame_index[rows]] if timestamps is not None else None,
+            status=status[rows],
+            percentage=percentage[rows],
+        )
+    return timelines
@@ -0,0 +1,152 @@
+"""
+Address resolution and connection setup for the broker.
+
+Host names are resolved once and cached, so reconnects do not repeat a blocking
+lookup; the standard resolver does not expose record TTLs, so entries live for a
+fixed time. When a lookup fails, the expired addresses are used rather than none.
+
+`open_connection` races the resolved addresses in the spirit of happy eyeballs
+(RFC 8305): address families are interleaved, a new attempt starts every
+`attempt_delay` seconds (or as soon as one fails) and the first socket to connect
+wins, the others are closed. A connection therefore takes as long as the fastest
+reachable address, not the sum of the timeouts of the unreachable ones.
+"""
+
+import errno
+import logging
+import os
+import selectors
+import socket
+import threading
+import time
+from collections.abc import Callable
+
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DNS_TTL = 300.0  # seconds a resolved address list is reused
+ATTEMPT_DELAY = 0.25  # seconds before the next address is tried while earlier attempts are pending
+CONNECT_TIMEOUT = 10.0
+
+type Address = tuple[int, tuple]  # (address family, socket address)
+
+_IN_PROGRESS = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN}
+
+
+def _interleave(addresses: list[Address]) -> list[Address]:
+    """Alternate address families, starting with the resolver's preferred one."""
+    families: dict[int, list[Address]] = {}
+    for address in addresses:
+        families.setdefault(address[0], []).append(address)
+    queues = list(families.values())
+    ordered = []
+    while queues:
+        for queue in queues:
+            ordered.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+
+class Resolver:
+    """Caches the addresses of host names."""
+
+    def __init__(self, ttl: float = DEFAULT_DNS_TTL, metrics: Metrics | None = None,
+                 getaddrinfo: Callable = socket.getaddrinfo):
+        self.ttl = ttl
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._getaddrinfo = getaddrinfo
+        self._cache: dict[tuple[str, int], tuple[float, list[Address]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> list[Address]:
+        """Addresses of `host`, ordered for `open_connection`. Raises OSError if nothing is known."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get((host, port))
+        if cached is not None and cached[0] > now:
+            self.metrics.increment("dns.cache_hits")
+            return cached[1]
+
+        self.metrics.increment("dns.lookups")
+        started = time.monotonic()
+        try:
+            infos = self._getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            self.metrics.increment("dns.failures")
+            if cached is None:
+                raise
+            logger.warning("Failed to resolve %s, using the previous addresses: %s", host, e)
+            return cached[1]
+        finally:
+            self.metrics.observe("dns.lookup", time.monotonic() - started)
+
+        addresses = _interleave(list(dict.fromkeys((family, sockaddr) for family, _, _, _, sockaddr in infos)))
+        with self._lock:
+            self._cache[(host, port)] = (time.monotonic() + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host: str, port: int) -> None:
+        """Forget the addresses of `host`, e.g. after none of them could be reached."""
+        with self._lock:
+            self._cache.pop((host, port), None)
+
+
+def open_connection(addresses: list[Address], timeout: float = CONNECT_TIMEOUT,
+                    attempt_delay: float = ATTEMPT_DELAY) -> tuple[socket.socket, tuple]:
+    """
+    Connect to the first reachable address. Returns the blocking socket and the address it is
+    connected to; raises TimeoutError or the last connection error if none could be reached.
+    """
+    if not addresses:
+        raise OSError("No addresses to connect to")
+
+    deadline = time.monotonic() + timeout
+    pending = list(addresses)
+    attempts: dict[socket.socket, tuple] = {}
+    last_error: OSError | None = None
+    next_attempt_at = 0.0
+    selector = selectors.DefaultSelector()
+    try:
+        while pending or attempts:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+
+            if pending and (not attempts or now >= next_attempt_at):
+                family, sockaddr = pending.pop(0)
+                sock = socket.socket(family, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                error = sock.connect_ex(sockaddr)
+                if error not in _IN_PROGRESS:
+                    last_error = OSError(error, os.strerror(error))
+                    sock.close()
+                    continue
+                selector.register(sock, selectors.EVENT_WRITE, sockaddr)
+                attempts[sock] = sockaddr
+                next_attempt_at = now + attempt_delay
+                continue
+
+            wait = deadline - now
+            if pending:
+                wait = min(wait, next_attempt_at - now)
+            for key, _ in selector.select(max(wait, 0.0)):
+                sock = key.fileobj
+                selector.unregister(sock)
+                del attempts[sock]
+                error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if error == 0:
+                    sock.setblocking(True)
+                    return sock, key.data
+                last_error = OSError(error, os.strerror(error))
+                logger.debug("Failed to connect to %s: %s", key.data, last_error)
+                sock.close()
+                next_attempt_at = time.monotonic()  # a failed attempt starts the next one at once
+    finally:
+        for sock in attempts:
+            sock.close()
+        selector.close()
+
+    if last_error is not None and not pending and not attempts:
+        raise last_error
+    raise TimeoutError(f"Timed out connecting to {len(addresses)} address(es)")
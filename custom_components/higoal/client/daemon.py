@@ -0,0 +1,281 @@
+"""
+Standalone client daemon.
+
+Runs the Manager and the cloud connection out of the Home Assistant process and
+serves the local IPC API described in client.ipc on a Unix socket. Protocol work
+(the broker socket, checksums, frame diffing, offline probing and status
+refreshes) happens here; attached clients only receive the status frames of
+devices whose state changed. Any number of clients (e.g. several Home Assistant
+instances) share the one cloud connection.
+
+Run from the integration directory, with the credentials in the environment:
+
+    HIGOAL_USERNAME=... HIGOAL_PASSWORD=... python -m client --socket /run/higoal/higoal.sock
+
+and set the same socket path as "Client daemon socket" in the integration options.
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import stat
+import threading
+import time
+
+from .ipc import encode
+from .manager import EntityListener, Manager, UnknownDevice
+from .mq import COMMAND_IDENTIFIER, is_status_request
+
+logger = logging.getLogger(__name__)
+
+DEVICE_SYNC_INTERVAL = 1800.0  # seconds between reconciliations of the device list with the cloud
+STALE_REFRESH_INTERVAL = 60.0  # seconds between looks for silent devices, see client.refresh
+CLIENT_QUEUE_SIZE = 1024  # messages queued per client before it is considered stuck and dropped
+
+
+class _Client:
+    """One attached connection. Writes go through a bounded queue so a slow client never blocks the broker."""
+
+    def __init__(self, daemon: "Daemon", sock: socket.socket):
+        self.daemon = daemon
+        self.socket = sock
+        self.queue: queue.Queue[bytes | None] = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.closed = False
+        self._reader = threading.Thread(target=self._read, name="HigoalDaemonClient", daemon=True)
+        self._writer = threading.Thread(target=self._write, name="HigoalDaemonWriter", daemon=True)
+
+    def start(self) -> None:
+        self._reader.start()
+        self._writer.start()
+
+    def send(self, message: dict) -> None:
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(encode(message))
+        except queue.Full:
+            logger.warning("Dropping a client that does not keep up with the change stream")
+            self.close()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.daemon.detach(self)
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        try:
+            self.queue.put_nowait(None)  # wake up the writer
+        except queue.Full:
+            pass
+
+    def _write(self) -> None:
+        while (data := self.queue.get()) is not None:
+            try:
+                self.socket.sendall(data)
+            except OSError:
+                break
+        self.close()
+
+    def _read(self) -> None:
+        try:
+            with self.socket.makefile("rb") as reader:
+                for line in reader:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        self.send({"error": "malformed message"})
+                        continue
+                    reply = self.daemon.handle(self, message)
+                    if "id" in message:
+                        self.send({"id": message["id"], **reply})
+        except OSError:
+            pass
+        self.close()
+
+
+class DaemonListener(EntityListener):
+    """Turns Manager callbacks into the change stream of the daemon."""
+
+    def __init__(self, daemon: "Daemon"):
+        self.daemon = daemon
+
+    def on_entity_changed(self, entity):
+        self.daemon.publish_status(entity.device)
+
+    def on_device_added(self, device):
+        self.daemon.publish_devices_changed()
+
+    def on_device_updated(self, device, layout_changed: bool):
+        self.daemon.publish_devices_changed()
+
+    def on_device_removed(self, device):
+        self.daemon.publish_devices_changed()
+
+
+class Daemon:
+    """Serves a Manager on a Unix socket."""
+
+    def __init__(self, manager: Manager, path: str, mode: int = 0o660):
+        self.manager = manager
+        self.path = path
+        self.mode = mode
+        self.clients: set[_Client] = set()
+        self._published: dict[str, bytes] = {}  # device id -> status frame last sent to the clients
+        self._server: socket.socket | None = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+            os.unlink(self.path)  # left over from a previous run
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        os.chmod(self.path, self.mode)
+        self._server.listen()
+        threading.Thread(target=self._accept, name="HigoalDaemon", daemon=True).start()
+        logger.info("Listening on %s", self.path)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        # Unlink first so clients cannot connect into the backlog of a closing socket
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+        if self._server is not None:
+            self._server.close()
+        for client in list(self.clients):
+            client.close()
+
+    def _accept(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                sock, _ = self._server.accept()
+            except OSError:
+                break
+            client = _Client(self, sock)
+            with self._lock:
+                self.clients.add(client)
+            client.start()
+            # Let the client catch up on device changes it missed while detached
+            client.send({"event": "devices"})
+            self.manager.metrics.set("daemon.clients", len(self.clients))
+
+    def detach(self, client: _Client) -> None:
+        with self._lock:
+            self.clients.discard(client)
+        self.manager.metrics.set("daemon.clients", len(self.clients))
+
+    def broadcast(self, message: dict) -> None:
+        with self._lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.send(message)
+
+    def publish_status(self, device) -> None:
+        status = device._status
+        # Called once per changed button; the frame is only sent once
+        if status is None or self._published.get(device.id) is status:
+            return
+        self._published[device.id] = status
+        self.broadcast({"frame": status.hex()})
+
+    def publish_devices_changed(self) -> None:
+        self.broadcast({"event": "devices"})
+
+    def handle(self, client: _Client, message: dict) -> dict:
+        """Carry out a request, returning the reply (sent only if the request has an id)."""
+        op = message.get("op")
+        if op == "devices":
+            return {"devices": self.manager.device_repository.last_records}
+        if op == "statuses":
+            return {"statuses": self.manager.status_snapshot()}
+        if op == "metrics":
+            return {"metrics": self.manager.metrics.snapshot()}
+        if op == "send":
+            try:
+                frames = [bytes.fromhex(frame) for frame in message.get("frames", [])]
+            except (TypeError, ValueError):
+                return {"error": "malformed frame"}
+            commands = []
+            for frame in frames:
+                if is_status_request(frame):
+                    self._answer_status_request(client, frame)
+                else:
+                    commands.append(frame)
+            return {"sent": self.manager.send_frames(commands)}
+        return {"error": f"unknown op {op!r}"}
+
+    def _answer_status_request(self, client: _Client, frame: bytes) -> None:
+        """Answer from the last known status; only devices without one are asked over the cloud."""
+        device = self.manager.device_map.get(tuple(frame[COMMAND_IDENTIFIER]))
+        if device is None or device is UnknownDevice:
+            self.manager.send_command(frame)
+        elif device._status is not None:
+            client.send({"frame": device._status.hex()})
+        else:
+            self.manager.request_status(device)
+
+    def serve_forever(self) -> None:
+        """Connect to the cloud and keep the device list and statuses fresh until stop() is called."""
+        threading.Thread(target=self.manager.refresh, name="HigoalConnect", daemon=True).start()
+        next_sync = time.monotonic() + DEVICE_SYNC_INTERVAL
+        while not self._stop_event.wait(STALE_REFRESH_INTERVAL):
+            self.manager.refresh_stale_devices()
+            self.manager.refresh_expired_token()
+            if time.monotonic() >= next_sync:
+                next_sync = time.monotonic() + DEVICE_SYNC_INTERVAL
+                try:
+                    self.manager.sync_devices()
+                except Exception as e:  # the cloud may be unreachable, the next run retries
+                    logger.warning("Failed to refresh the device list: %s", e)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m client", description="Higoal client daemon.")
+    parser.add_argument("--socket", required=True, help="path of the Unix socket to serve on")
+    parser.add_argument("--mode", type=lambda value: int(value, 8), default=0o660,
+                        help="permissions of the socket, octal (default 660)")
+    parser.add_argument("--host", default="server.higoal.net")
+    parser.add_argument("--api-port", type=int, default=8143)
+    parser.add_argument("--broker-port", type=int, default=17670)
+    parser.add_argument("--broker-connections", type=int, default=1,
+                        help="see Manager(broker_connections=...)")
+    parser.add_argument("--offline-probe-interval", type=float, default=0.0,
+                        help="see Manager(offline_probe_interval=...)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    username = os.environ.get("HIGOAL_USERNAME")
+    password = os.environ.get("HIGOAL_PASSWORD")
+    if not username or not password:
+        parser.error("HIGOAL_USERNAME and HIGOAL_PASSWORD must be set")
+
+    manager = Manager(domain=args.host, port=args.api_port, broker_port=args.broker_port,
+                      username=username, password=password,
+                      broker_connections=args.broker_connections,
+                      offline_probe_interval=args.offline_probe_interval)
+    daemon = Daemon(manager, args.socket, mode=args.mode)
+    manager.entity_listener = DaemonListener(daemon)
+    manager.get_devices()
+    daemon.start()
+
+    def _stop(_signum, _frame):
+        daemon.stop()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        daemon.serve_forever()
+    finally:
+        manager.stop(timeout=5.0)
+        daemon.stop()
@@ -1,3 +1,4 @@
+import time
 from dataclasses import dataclass, field
 from typing import Optional
 
@@ -8,10 +9,51 @@ _ON_VALUE = 255
 _SET_PERCENTAGE = 241
 _OFFLINE_VALUE = 0
 
+# Layout of the per-button blocks in a 48-byte frame, relative to the button index.
+_STATUS_OFFSET = 18  # status byte of button 0
+_PERCENTAGE_FLAG_OFFSET = 8  # non-zero when the percentage below is the reported one
+_PERCENTAGE_OFFSET = 19  # reported percentage (also the set-percentage slot in commands)
+_FALLBACK_PERCENTAGE_OFFSET = 16  # percentage used while the flag is zero
+
+_CADENCE_WEIGHT = 0.2  # weight of a new interval in the frame cadence moving average
+
+# Host list fields read by Device.init_from; anything else the cloud sends is ignored
+RECORD_FIELDS = ("id", "type", "name", "roomId", "homeId", "ssid", "mac", "version", "buttonName", "buttonType")
+
 TYPE_SWITCH = 1
 TYPE_DIMMER = 2
 TYPE_SHUTTER = 3
 
+ACTION_TURN_ON = "turn_on"
+ACTION_TURN_OFF = "turn_off"
+
+
+@dataclass(frozen=True, slots=True)
+class EntityState:
+    """Decoded state of a single button, built once per received status frame."""
+
+    status: int  # The raw status byte of the button
+    percentage: float | None  # See `Entity.percentage`, None for plain switches
+
+    @property
+    def is_on(self) -> bool:
+        return self.status == _ON_VALUE
+
+    @property
+    def is_online(self) -> bool:
+        return self.status != _OFFLINE_VALUE
+
+    @classmethod
+    def decode(cls, response: bytes, index: int, entity_type: int) -> "EntityState":
+        percentage = None
+        if entity_type in {TYPE_SHUTTER, TYPE_DIMMER}:
+            base = _STATUS_OFFSET + index
+            value_offset = base + _FALLBACK_PERCENTAGE_OFFSET
+            if response[base + _PERCENTAGE_FLAG_OFFSET] != 0:
+                value_offset = base + _PERCENTAGE_OFFSET
+            percentage = max(min(response[value_offset], 100), 0) / 100
+        return cls(status=response[_STATUS_OFFSET + index], percentage=percentage)
+
 
 @dataclass
 class Entity:
@@ -22,19 +64,26 @@ class Entity:
     type: int  # The type of button
     device: "Device" = field(repr=False)  # Reference to the containing device
     _response: bytes = field(repr=False, default=None)  # The current state
+    _state: EntityState | None = field(repr=False, default=None)  # The decoded current state
 
     @property
     def response(self):
         return self._response
 
+    @property
+    def state(self) -> EntityState | None:
+        """The decoded state, or None if no status was received yet."""
+        return self._state
+
     def set_response(self, response: bytes):
         old_value = self._response or bytes([0] * 48)
-        old_status = old_value[18 + self.id]
-        old_percentage = old_value[18 + self.id + 19]
+        old_status = old_value[_STATUS_OFFSET + self.id]
+        old_percentage = old_value[_STATUS_OFFSET + self.id + _PERCENTAGE_OFFSET]
 
-        new_status = response[18 + self.id]
-        new_percentage = response[18 + self.id + 19]
+        new_status = response[_STATUS_OFFSET + self.id]
+        new_percentage = response[_STATUS_OFFSET + self.id + _PERCENTAGE_OFFSET]
         self._response = response
+        self._state = EntityState.decode(response, self.id, self.type)
         if old_status != new_status or old_percentage != new_percentage:
             # something has changed in the entity
             return True
@@ -51,56 +100,81 @@ class Entity:
             return 0
         return _OFF_VALUE
 
-    def turn_on(self):
+    def turn_on_command(self) -> bytes:
         """
-        Turn on the switch
+        Build the command which turns on the switch.
         """
-        action = self._get_on_action()
-        cmd = generate_command(
+        return generate_command(
             device_id=self.device.id,
             device_type=self.device.type,
             read_only=False,
             entity=self.id,
             entity_type=self.type,
-            action=action,
+            action=self._get_on_action(),
         )
-        self.device.manager.send_command(cmd)
 
-    def turn_off(self):
+    def turn_off_command(self) -> bytes:
         """
-        Turn off the switch
+        Build the command which turns off the switch.
         """
         if self.type == TYPE_SHUTTER:
             # for type 3 the turn-off command is the same as the turn-on command.
-            self.turn_on()
-            return
-        action = self._get_off_action()
-        cmd = generate_command(
+            return self.turn_on_command()
+        return generate_command(
             device_id=self.device.id,
             device_type=self.device.type,
             read_only=False,
             entity=self.id,
             entity_type=self.type,
-            action=action,
+            action=self._get_off_action(),
         )
-        self.device.manager.send_command(cmd)
 
-    def set_percentage(self, percentage: float):
+    def set_percentage_command(self, percentage: float) -> bytes | None:
+        """
+        Build the command which sets the dimmer level, or None for non-dimmers.
+        """
         if self.type != TYPE_DIMMER:
-            return
+            return None
         value = max(0, min(100, int(percentage * 100)))
-        action = 241
         cmd = generate_command(
             device_id=self.device.id,
             device_type=self.device.type,
             read_only=False,
             entity=self.id,
             entity_type=self.type,
-            action=action,
+            action=_SET_PERCENTAGE,
         )
         cmd = list(cmd)
-        cmd[18 + self.id + 19] = value
-        self.device.manager.send_command(bytes(cmd))
+        cmd[_STATUS_OFFSET + self.id + _PERCENTAGE_OFFSET] = value
+        return bytes(cmd)
+
+    def command_for(self, action: str) -> bytes | None:
+        """
+        Build the command for one of the ACTION_* names, or None if unsupported.
+        """
+        if action == ACTION_TURN_ON:
+            return self.turn_on_command()
+        if action == ACTION_TURN_OFF:
+            return self.turn_off_command()
+        return None
+
+    def turn_on(self):
+        """
+        Turn on the switch
+        """
+        self.device.manager.send_command(self.turn_on_command())
+
+    def turn_off(self):
+        """
+        Turn off the switch
+        """
+        self.device.manager.send_command(self.turn_off_command())
+
+    def set_percentage(self, percentage: float):
+        cmd = self.set_percentage_command(percentage)
+        if cmd is None:
+            return
+        self.device.manager.send_command(cmd)
 
     def can_set_percentage(self) -> bool:
         return self.type == TYPE_DIMMER
@@ -112,38 +186,37 @@ class Entity:
         """
         Check if the switch is turned on or not.
         """
-        response = self._current_response()
-        return response[18 + self.id] == _ON_VALUE
+        return self._state is not None and self._state.is_on
 
     def is_online(self):
         """
         Check if the switch is online.
         """
-        response = self._current_response()
-        return response[18 + self.id] != _OFFLINE_VALUE
+        return self._state is not None and self._state.is_online
 
     def percentage(self) -> float | None:
         """
         Get percentage of blinds 1.0 means fully closed while 0.0 means fully open.
         """
-        if self.type not in {TYPE_SHUTTER, TYPE_DIMMER}:
+        if self._state is None:
             return None
-        status = self._current_response()
-
-        value_offset = 18 + self.id + 16
-        if status[18 + self.id + 8] != 0:
-            value_offset = 18 + self.id + 19
-
-        value = max(min(status[value_offset], 100), 0)
-        return value / 100
+        return self._state.percentage
 
-    def _current_response(self, use_cache: bool = True) -> bytes:
-        if self.response:
-            return self.response
-
-        self.device.manager.send_command(self.status_command())
+    def transitions(self, since: float | None = None) -> list["Transition"]:
+        """
+        Recent state transitions of the button, oldest first. Empty unless the manager keeps a history.
+        """
+        if self.device.history is None:
+            return []
+        return self.device.history.transitions(self.id, since)
 
-        return bytes([0] * 48)
+    def history_stats(self, since: float | None = None) -> Optional["HistoryStats"]:
+        """
+        Aggregates over the recorded transitions, or None unless the manager keeps a history.
+        """
+        if self.device.history is None:
+            return None
+        return self.device.history.stats(self.id, since)
 
     def get_related_entity(self) -> Optional["Entity"]:
         if self.type != TYPE_SHUTTER:
@@ -180,6 +253,9 @@ class Device:
     entities: list[Entity] = field(repr=False)
     manager: 'Manager' = field(repr=False)
     _status: bytes = field(repr=False, default=None)
+    history: "StateHistory | None" = field(repr=False, default=None)  # Optional ring buffer of past states
+    last_frame_at: float | None = field(repr=False, default=None)  # time.monotonic() of the last status frame
+    frame_interval: float | None = field(repr=False, default=None)  # moving average of the seconds between frames
 
     @property
     def model_name(self):
@@ -247,21 +323,90 @@ class Device:
             if did_change:
                 entities.append(entity)
 
+        if self.history is not None and entities:
+            now = time.time()
+            for entity in entities:
+                self.history.record(entity.id, now, entity.state)
+
         return entities
 
+    def restore_status(self, response: bytes) -> bool:
+        """
+        Seed the last known status (e.g. persisted before a restart) without reporting changes.
+        A status received from the device always wins over the restored one.
+        """
+        if self._status is not None or len(response) != 48:
+            return False
+
+        self._status = response
+        for entity in self.entities:
+            entity.set_response(response)
+        return True
+
     @property
     def offline(self):
         return any([not entity.is_online() for entity in self.entities])
 
+    def reports_offline(self, response: bytes) -> bool:
+        """Whether a status frame would make the device `offline`."""
+        return any(response[_STATUS_OFFSET + entity.id] == _OFFLINE_VALUE for entity in self.entities)
+
+    def record_frame(self, now: float, learn_cadence: bool = True) -> None:
+        """Note the arrival of a status frame, updating the cadence unless told otherwise."""
+        if learn_cadence and self.last_frame_at is not None:
+            interval = now - self.last_frame_at
+            if self.frame_interval is None:
+                self.frame_interval = interval
+            else:
+                self.frame_interval += _CADENCE_WEIGHT * (interval - self.frame_interval)
+        self.last_frame_at = now
+
+    @property
+    def layout(self) -> list[tuple[int, int, bool]]:
+        """(index, type, named) of every button; `named` matters for how shutter buttons pair up."""
+        return [(entity.id, entity.type, entity.name != "") for entity in self.entities]
+
+    def update_from(self, other: "Device") -> bool:
+        """
+        Take over the metadata and buttons of a newer record of the same device, in place.
+        Buttons are only replaced when the layout changed, which is returned.
+        """
+        self.type = other.type
+        self.name = other.name
+        self.room_id = other.room_id
+        self.home_id = other.home_id
+        self.ssid = other.ssid
+        self.mac = other.mac
+        self.version = other.version
+
+        if self.layout == other.layout:
+            for entity, updated in zip(self.entities, other.entities, strict=True):
+                entity.name = updated.name
+            return False
+
+        for entity in other.entities:
+            entity.device = self
+            if self._status is not None:
+                entity.set_response(self._status)
+        self.entities[:] = other.entities
+        return True
+
 
 class DeviceRepository:
     def __init__(self, manager):
         self.manager = manager
+        self.last_records: list[dict] = []  # raw records of the last fetch, served to clients of the daemon
 
     def get_devices(self) -> list[Device]:
         """
         Get devices (hosts) assigned to the account.
         """
+        return [Device.init_from(device, self.manager) for device in self.get_device_records()]
+
+    def get_device_records(self) -> list[dict]:
+        """
+        Get the raw host list records of all homes of the account.
+        """
         if not self.manager.api.is_signed_in:
             self.manager.api.sign_in()
 
@@ -271,10 +416,10 @@ class DeviceRepository:
             headers = {
                 "content-type": "application/x-www-form-urlencoded; charset=utf-8"
             }
-            response = self.manager.api.session.request(
+            response = self.manager.api.http.request(
                 "POST", f"{self.manager.api.url}/get_host_list", data=payload, headers=headers
             )
             body = response.json()
             devices.extend(body.get("repData", []))
-        devices = [Device.init_from(device, self.manager) for device in devices]
+        self.last_records = devices
         return devices
@@ -0,0 +1,169 @@
+"""
+Async subscription API for entity changes.
+
+The broker thread publishes into a bounded per-subscriber buffer and only wakes the
+consumer's event loop when it is actually waiting, so a slow consumer never grows
+memory without bound and, unless it asked for backpressure, never slows the
+receive loop down.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from enum import StrEnum
+
+from .device import EntityState
+
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_BLOCK_TIMEOUT = 1.0  # seconds the publisher may wait with OverflowPolicy.BLOCK
+
+
+class OverflowPolicy(StrEnum):
+    """What happens when a subscriber's buffer is full."""
+
+    DROP_OLDEST = "drop_oldest"  # discard the oldest buffered event
+    DROP_NEWEST = "drop_newest"  # discard the incoming event
+    BLOCK = "block"  # make the publisher wait for room (up to a timeout), then drop the incoming event
+
+
+@dataclass(frozen=True, slots=True)
+class EntityChangeEvent:
+    """A change of a single button, as seen in a status frame."""
+
+    device_id: str
+    device_identifier: tuple[int, int, int, int]
+    entity_id: int  # The index of the button
+    old_state: EntityState | None
+    new_state: EntityState
+    timestamp: float  # time.time() when the frame arrived
+
+    @property
+    def old_status(self) -> int | None:
+        return self.old_state.status if self.old_state is not None else None
+
+    @property
+    def new_status(self) -> int:
+        return self.new_state.status
+
+    @property
+    def percentage(self) -> float | None:
+        return self.new_state.percentage
+
+
+class Subscription:
+    """An async iterator over the events published after it was created."""
+
+    def __init__(self, hub: "EventHub", loop: asyncio.AbstractEventLoop, maxsize: int,
+                 policy: OverflowPolicy, block_timeout: float):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self._hub = hub
+        self._loop = loop
+        self._maxsize = maxsize
+        self._policy = policy
+        self._block_timeout = block_timeout
+        self._queue: deque[EntityChangeEvent] = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._waiter: asyncio.Future | None = None
+        self._closed = False
+        self.dropped = 0
+
+    def publish(self, event: EntityChangeEvent) -> None:
+        """Buffer an event. Safe to call from any thread."""
+        with self._lock:
+            if self._closed:
+                return
+            if len(self._queue) >= self._maxsize:
+                if self._policy == OverflowPolicy.DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self._policy == OverflowPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                elif not self._not_full.wait_for(
+                        lambda: self._closed or len(self._queue) < self._maxsize, self._block_timeout
+                ) or self._closed:
+                    self.dropped += 1
+                    return
+            self._queue.append(event)
+            waiter, self._waiter = self._waiter, None
+
+        if waiter is not None:
+            self._loop.call_soon_threadsafe(_wake, waiter)
+
+    def close(self) -> None:
+        """Stop the subscription. Buffered events can still be consumed."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._not_full.notify_all()
+            waiter, self._waiter = self._waiter, None
+        self._hub.unsubscribe(self)
+        if waiter is not None:
+            self._loop.call_soon_threadsafe(_wake, waiter)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> EntityChangeEvent:
+        while True:
+            with self._lock:
+                if self._queue:
+                    event = self._queue.popleft()
+                    self._not_full.notify()
+                    return event
+                if self._closed:
+                    raise StopAsyncIteration
+                waiter = self._waiter = self._loop.create_future()
+            await waiter
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class EventHub:
+    """Fans entity change events out to any number of subscriptions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: tuple[Subscription, ...] = ()
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def subscribe(self, maxsize: int = DEFAULT_QUEUE_SIZE,
+                  policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                  block_timeout: float = DEFAULT_BLOCK_TIMEOUT) -> Subscription:
+        """Create a subscription bound to the running event loop."""
+        subscription = Subscription(self, asyncio.get_running_loop(), maxsize, policy, block_timeout)
+        with self._lock:
+            self._subscriptions = (*self._subscriptions, subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+
+    def publish(self, event: EntityChangeEvent) -> None:
+        for subscription in self._subscriptions:
+            subscription.publish(event)
+
+    def close(self) -> None:
+        for subscription in self._subscriptions:
+            subscription.close()
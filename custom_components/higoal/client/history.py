@@ -0,0 +1,122 @@
+"""
+Compact per-device state history.
+
+Every button slot of a device gets a fixed-size ring buffer of
+(timestamp, status byte, percentage byte) entries stored in flat arrays, so
+memory stays constant per entity no matter how long the process runs.
+"""
+
+from array import array
+from dataclasses import dataclass
+
+from .device import _ON_VALUE, EntityState
+
+NO_PERCENTAGE = 255  # stored when the button has no percentage
+
+
+@dataclass(frozen=True, slots=True)
+class Transition:
+    timestamp: float
+    status: int
+    percentage: float | None
+
+    @property
+    def is_on(self) -> bool:
+        return self.status == _ON_VALUE
+
+
+@dataclass(frozen=True, slots=True)
+class HistoryStats:
+    """Aggregates over the transitions kept for one slot."""
+
+    transitions: int
+    activations: int  # number of switches into the on state
+    on_time: float  # seconds spent on, counting only completed on periods
+    mean_on_duration: float | None
+    max_on_duration: float | None
+
+
+class StateHistory:
+    """Fixed-size ring buffer of state transitions for each button slot of a device."""
+
+    def __init__(self, slots: int, capacity: int):
+        if slots <= 0 or capacity <= 0:
+            raise ValueError("slots and capacity must be positive")
+        self.slots = slots
+        self.capacity = capacity
+        self._timestamps = array("d", bytes(8 * slots * capacity))
+        self._statuses = bytearray(slots * capacity)
+        self._percentages = bytearray(slots * capacity)
+        self._next = [0] * slots
+        self._counts = [0] * slots
+
+    def record(self, slot: int, timestamp: float, state: EntityState) -> None:
+        """Append a state to the slot's ring buffer, overwriting the oldest entry once full."""
+        if not 0 <= slot < self.slots:
+            return
+        index = slot * self.capacity + self._next[slot]
+        self._timestamps[index] = timestamp
+        self._statuses[index] = state.status
+        self._percentages[index] = (
+            NO_PERCENTAGE if state.percentage is None else round(state.percentage * 100)
+        )
+        self._next[slot] = (self._next[slot] + 1) % self.capacity
+        self._counts[slot] = min(self._counts[slot] + 1, self.capacity)
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+    def transitions(self, slot: int, since: float | None = None) -> list[Transition]:
+        """Return the recorded transitions of a slot, oldest first."""
+        if not 0 <= slot < self.slots:
+            return []
+        count = self._counts[slot]
+        base = slot * self.capacity
+        start = (self._next[slot] - count) % self.capacity
+        result = []
+        for offset in range(count):
+            index = base + (start + offset) % self.capacity
+            timestamp = self._timestamps[index]
+            if since is not None and timestamp < since:
+                continue
+            percentage = self._percentages[index]
+            result.append(Transition(
+                timestamp=timestamp,
+                status=self._statuses[index],
+                percentage=None if percentage == NO_PERCENTAGE else percentage / 100,
+            ))
+        return result
+
+    def on_durations(self, slot: int, since: float | None = None) -> list[float]:
+        """
+        Durations of the completed on periods of a slot.
+        For shutter buttons this is the travel time of each movement.
+        """
+        durations = []
+        turned_on_at = None
+        for transition in self.transitions(slot, since):
+            if transition.is_on:
+                if turned_on_at is None:
+                    turned_on_at = transition.timestamp
+            elif turned_on_at is not None:
+                durations.append(transition.timestamp - turned_on_at)
+                turned_on_at = None
+        return durations
+
+    def stats(self, slot: int, since: float | None = None) -> HistoryStats:
+        transitions = self.transitions(slot, since)
+        activations = 0
+        previous_on = False
+        for transition in transitions:
+            if transition.is_on and not previous_on:
+                activations += 1
+            previous_on = transition.is_on
+
+        durations = self.on_durations(slot, since)
+        return HistoryStats(
+            transitions=len(transitions),
+            activations=activations,
+            on_time=sum(durations),
+            mean_on_duration=sum(durations) / len(durations) if durations else None,
+            max_on_duration=max(durations) if durations else None,
+        )
@@ -0,0 +1,187 @@
+"""
+Client side of the local IPC API of the client daemon (see client.daemon).
+
+The daemon owns the Manager and the cloud connection; Home Assistant (or any
+other process) attaches over a Unix socket. Messages are JSON objects, one per
+line, with frames as hex strings:
+
+    -> {"id": 1, "op": "devices"}                  <- {"id": 1, "devices": [<host list records>]}
+    -> {"id": 2, "op": "statuses"}                 <- {"id": 2, "statuses": {<device id>: <frame>}}
+    -> {"id": 3, "op": "metrics"}                  <- {"id": 3, "metrics": {...}}
+    -> {"op": "send", "frames": [<frame>, ...]}    (no reply without an id)
+    <- {"frame": <frame>}                          status frame of a device whose state changed
+    <- {"event": "devices"}                        the device list changed, fetch it again
+
+Every connection receives the change stream. Status requests sent with "send"
+are answered from the daemon's last known status, so they cost no cloud traffic.
+"""
+
+import json
+import logging
+import socket
+from collections.abc import Callable
+
+from .device import DeviceRepository
+from .metrics import Metrics
+from .mq import BATCH_MESSAGE_INTERVAL, COMMAND_IDENTIFIER, RETRY_INTERVAL, Message, MessageBroker
+from .outbox import OutboundBuffer
+from .trace import DIRECTION_IN, DIRECTION_OUT, FrameTracer
+
+logger = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 10.0  # seconds
+
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+def request(path: str, op: str, timeout: float = REQUEST_TIMEOUT, **arguments) -> dict:
+    """Send a single request to the daemon on a connection of its own and return the reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(encode({"id": 1, "op": op, **arguments}))
+        with sock.makefile("rb") as reader:
+            for line in reader:
+                reply = json.loads(line)
+                if reply.get("id") != 1:
+                    continue  # part of the change stream
+                if "error" in reply:
+                    raise RuntimeError(f"Daemon request {op} failed: {reply['error']}")
+                return reply
+    raise ConnectionError("Daemon closed the connection")
+
+
+class IpcDeviceRepository(DeviceRepository):
+    """Gets the host list from the daemon instead of the cloud."""
+
+    def __init__(self, manager, path: str):
+        super().__init__(manager)
+        self.path = path
+
+    def get_device_records(self) -> list[dict]:
+        self.last_records = request(self.path, "devices")["devices"]
+        return self.last_records
+
+
+class IpcBroker(MessageBroker):
+    """
+    Stands in for MessageBroker when a client daemon owns the cloud connection.
+    Reconnecting, buffering while disconnected and the handover work as for the cloud connection.
+    """
+
+    def __init__(self, path: str, name: str = "HigoalIpc",
+                 retry_interval: float = RETRY_INTERVAL,
+                 batch_interval: float = BATCH_MESSAGE_INTERVAL,
+                 buffer_size: int = 8192,
+                 tracer: FrameTracer | None = None,
+                 outbox: OutboundBuffer | None = None,
+                 metrics: Metrics | None = None,
+                 on_devices_changed: Callable[[], None] | None = None):
+        super().__init__(api=None, host=path, port=None, buffer_size=buffer_size, name=name,
+                         retry_interval=retry_interval, batch_interval=batch_interval,
+                         tracer=tracer, outbox=outbox, metrics=metrics)
+        self.path = path
+        self.on_devices_changed = on_devices_changed
+
+    @property
+    def endpoint(self) -> str:
+        return self.path
+
+    def _open_socket(self) -> tuple[socket.socket, tuple]:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(REQUEST_TIMEOUT)
+            sock.connect(self.path)
+            sock.settimeout(None)
+        except OSError:
+            sock.close()
+            self.metrics.increment("ipc.connect.failures")
+            raise
+        return sock, (self.path,)
+
+    def on_connect(self):
+        # The daemon is authenticated with the cloud already
+        self.flush_outbox()
+
+    def send_messages(self, messages: list[Message], interval: float | None = None) -> int:
+        """Hand the whole batch to the daemon, which paces it towards the cloud."""
+        if not messages:
+            return 0
+        if self._send_frames([message.data for message in messages]):
+            return len(messages)
+        for message in messages:
+            self._buffer(message.data)
+        return 0
+
+    def _send_message_internal(self, message: Message) -> bool:
+        return self._send_frames([message.data])
+
+    def _send_frames(self, frames: list[bytes]) -> bool:
+        try:
+            with self._lock:
+                if not self.socket or not self.connected:
+                    return False
+                if self.tracer.enabled:
+                    for data in frames:
+                        self.tracer.trace(DIRECTION_OUT, data, tuple(data[COMMAND_IDENTIFIER]))
+                self.socket.sendall(encode({"op": "send", "frames": [data.hex() for data in frames]}))
+                return True
+        except Exception as e:
+            logger.error("Failed to send to the daemon: %s", e)
+            return False
+
+    def _dispatch(self, message: dict) -> None:
+        if "frame" in message:
+            data = bytes.fromhex(message["frame"])
+            self._receiving.set()
+            frame = Message(data)
+            if self.tracer.enabled:
+                self.tracer.trace(DIRECTION_IN, data, frame.device_identifier)
+            self.on_receive(frame)
+        elif message.get("event") == "devices" and self.on_devices_changed is not None:
+            self.on_devices_changed()
+
+    def run(self) -> None:
+        """Main thread method for receiving messages."""
+        logger.info("IPC thread started for %s", self.path)
+        reader = reader_socket = None
+        while self.running and not self._stop_event.is_set():
+            try:
+                if reader_socket is not self.socket:
+                    if reader is not None:
+                        reader.close()
+                    reader_socket = self.socket
+                    reader = reader_socket.makefile("rb")
+                line = reader.readline()
+                if line:
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        logger.warning("Ignoring a malformed message from the daemon")
+                        continue
+                    self._dispatch(message)
+                    continue
+                logger.info("Daemon closed the connection")
+                if self._stop_event.is_set() or not self.reconnect:
+                    break
+                self.on_disconnect()
+            except Exception as e:
+                if self._stop_event.is_set() or not self.reconnect:
+                    break
+                logger.error("Error in IPC receive loop: %s", e)
+                self.on_disconnect()
+
+        if reader is not None:
+            reader.close()
+        with self._lock:
+            self.connected = False
+            if self.socket:
+                try:
+                    self.socket.close()
+                except OSError:
+                    pass
+                self.socket = None
+
+        logger.info("IPC thread ended")
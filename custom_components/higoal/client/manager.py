@@ -1,17 +1,48 @@
 import abc
+import hashlib
+import json
 import logging
+import queue
+import threading
+import time
+from collections.abc import Iterable, Mapping
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
 import requests
 from requests.exceptions import ConnectionError, RequestException
 
-from .mq import MessageBroker, Message, MessageHandler
-from .api import Api
-from .device import DeviceRepository
+from .mq import (
+    BATCH_MESSAGE_INTERVAL,
+    COMMAND_IDENTIFIER,
+    RETRY_INTERVAL,
+    Message,
+    MessageBroker,
+    MessageHandler,
+    command_key,
+    is_status_request,
+)
+from .api import _TOKEN_MAX_AGE, Api
+from .connect import Resolver
+from .device import RECORD_FIELDS, TYPE_SHUTTER, Device, DeviceRepository
+from .ipc import IpcBroker, IpcDeviceRepository
+from .events import DEFAULT_QUEUE_SIZE, EntityChangeEvent, EventHub, OverflowPolicy, Subscription
+from .history import StateHistory
+from .metrics import Metrics
+from .outbox import DEFAULT_MAX_SIZE, DEFAULT_TTL, OutboundBuffer
+from .refresh import RefreshScheduler
+from .registry import SnapshotRegistry
+from .shards import ShardedBroker, partition_homes
+from .transport import HttpClient
+from .trace import FrameTracer
 
 logger = logging.getLogger(__name__)
 
+STATUS_REQUEST_INTERVAL = 5.0  # seconds between status requests for a device that has not answered yet
+HANDOVER_TIMEOUT = 10.0  # seconds to wait for the first frame on a new connection before dropping the old one
+HANDOVER_ATTEMPTS = 3  # connection attempts for a replacement before the current connection is kept
+DUPLICATE_WINDOW = 0.25  # seconds in which an identical frame of a device is another delivery of the same push
+
 
 @dataclass
 class OfflineDevice:
@@ -22,6 +53,35 @@ class OfflineDevice:
 type UnknownDevice = object()
 
 
+@dataclass
+class SuspectDevice:
+    """An online device that reported offline, before the report is believed."""
+
+    device: 'Device'
+    since: float  # time.monotonic() of the first offline frame
+    frames: int  # consecutive offline frames so far
+    status: bytes  # the latest offline frame, applied once confirmed
+
+
+@dataclass(frozen=True)
+class DeviceChanges:
+    """Outcome of reconciling the device list with the cloud."""
+
+    added: list['Device']
+    updated: list['Device']  # existing devices whose record changed, updated in place
+    layout_changed: list['Device']  # the subset of `updated` whose buttons were replaced
+    removed: list['Device']
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+
+def _record_digest(record: dict) -> bytes:
+    """Digest of the fields a Device is built from, so volatile ones (online flags, timestamps) do not count."""
+    fields = [record.get(name) for name in RECORD_FIELDS]
+    return hashlib.sha1(json.dumps(fields, default=str).encode()).digest()
+
+
 class EntityListener(abc.ABC):
     """Entity Listener - Used to receive messages from broker."""
 
@@ -30,6 +90,11 @@ class EntityListener(abc.ABC):
         """Called when an entity is changed."""
         pass
 
+    def on_entities_changed(self, device: 'Device', entities: list['Entity']):
+        """Called once per status frame with the entities it changed; defaults to on_entity_changed for each."""
+        for entity in entities:
+            self.on_entity_changed(entity)
+
     @abc.abstractmethod
     def on_device_added(self, device: 'Device'):
         pass
@@ -38,6 +103,12 @@ class EntityListener(abc.ABC):
     def on_device_removed(self, device: 'Device'):
         pass
 
+    def on_device_updated(self, device: 'Device', layout_changed: bool):  # noqa: B027 - optional hook, no-op by default
+        """
+        Called when the cloud record of a known device changed (name, firmware, buttons).
+        With `layout_changed` the device's entities were replaced.
+        """
+
 
 class Manager(MessageHandler):
     def __init__(self,
@@ -47,101 +118,500 @@ class Manager(MessageHandler):
                  username: str = None,
                  password: str = None,
                  entity_listener: EntityListener = None,
-                 session: requests.Session = None):
+                 session: requests.Session = None,
+                 history_size: int = 0,
+                 broker_port: int = 17670,
+                 retry_interval: float = RETRY_INTERVAL,
+                 batch_interval: float = BATCH_MESSAGE_INTERVAL,
+                 buffer_size: int = 8192,
+                 token_max_age: timedelta = _TOKEN_MAX_AGE,
+                 offline_probe_interval: float = 0.0,
+                 offline_after_frames: int = 3,
+                 offline_after_seconds: float = 60.0,
+                 command_ttl: float = DEFAULT_TTL,
+                 command_buffer_size: int = DEFAULT_MAX_SIZE,
+                 daemon_socket: str | None = None,
+                 broker_connections: int = 1):
         self.domain = domain
-        self.api = Api(domain=domain, port=port, version=version, username=username, password=password, session=session)
+        self.broker_port = broker_port
+        self.metrics = Metrics()  # shared by the HTTP client, the resolver and every broker
+        self.api = Api(domain=domain, port=port, version=version, username=username, password=password,
+                       token_max_age=token_max_age, http=HttpClient(session, metrics=self.metrics))
         self.mq = None
-        self.device_repository = DeviceRepository(self)
-        self.device_map = {}
+        self._connecting_mq = None  # broker of a refresh that has not finished connecting yet
+        # With a daemon socket, a client daemon (see client.daemon) owns the cloud connection and this
+        # manager attaches to it: no sign in, devices and frames come from the daemon.
+        self.daemon_socket = daemon_socket
+        if daemon_socket:
+            self.device_repository = IpcDeviceRepository(self, daemon_socket)
+        else:
+            self.device_repository = DeviceRepository(self)
         self.entity_listener = entity_listener
-        self.offline_devices = {}
+        self.history_size = history_size  # entries kept per button, 0 disables the history
+        self._devices: SnapshotRegistry[tuple, 'Device'] = SnapshotRegistry()
+        self._offline_devices: SnapshotRegistry[tuple, OfflineDevice] = SnapshotRegistry()
+        self._status_requested_at: dict[tuple, float] = {}
+        self._record_digests: dict[str, bytes] = {}  # device id -> digest of its last host list record
+        self._event_hub = EventHub()
+        self.retry_interval = retry_interval
+        self.batch_interval = batch_interval
+        self.buffer_size = buffer_size
+        self.offline_probe_interval = offline_probe_interval  # seconds between probes of an offline device
+        # An online device is only taken offline after this many consecutive offline frames or seconds
+        self.offline_after_frames = offline_after_frames
+        self.offline_after_seconds = offline_after_seconds
+        self._suspects: dict[tuple, SuspectDevice] = {}
+        self.tracer = FrameTracer()  # shared by every broker this manager creates
+        self.refresh_scheduler = RefreshScheduler()
+        # Commands sent while no broker is connected, shared by every broker this manager creates
+        self.outbox = OutboundBuffer(key=command_key, ttl=command_ttl, max_size=command_buffer_size)
+        self.broker_connections = broker_connections  # homes are split over up to this many connections
+        self._home_shards: dict[str | None, int] = {}  # home id -> index of its connection, see client.shards
+        # Frames queued by queue_frames, sent by the writer thread; None stops the writer
+        self._outbound: queue.SimpleQueue[bytes | None] = queue.SimpleQueue()
+        self._writer: threading.Thread | None = None
+        self._writer_lock = threading.Lock()
+        # Guards the per-device state that several receive threads (see client.shards), the stale-device
+        # timer and device syncs touch: the suspects, the refresh scheduler, the last frames, applying a
+        # status and applying a reconciled device list. Only held for that bookkeeping, never around
+        # network I/O or listener callbacks.
+        self._receive_lock = threading.RLock()
+        # Last frame and its arrival per device: the catch-all shard and the old connection during a
+        # handover deliver a push twice, see _is_duplicate
+        self._last_frames: dict[tuple, tuple[bytes, float]] = {}
+        # Frames of unknown devices waiting for the device list lookup, see _look_up_unknown_device
+        self._unknown_frames: dict[tuple, Message] = {}
+        self._lookup: threading.Thread | None = None
+        self._lookup_lock = threading.Lock()
+        self.resolver = Resolver(metrics=self.metrics)  # addresses of the broker host, kept across reconnects
+
+    @property
+    def device_map(self) -> Mapping[tuple, 'Device']:
+        """Immutable snapshot of the known devices, safe to iterate from any thread."""
+        return self._devices.snapshot
+
+    @property
+    def offline_devices(self) -> Mapping[tuple, OfflineDevice]:
+        """Immutable snapshot of the devices currently considered offline."""
+        return self._offline_devices.snapshot
 
     def get_devices(self):
-        self.api.sign_in()
-        devices = self.device_repository.get_devices()
-        full_set = {device.identifier: device for device in devices}
+        changes = self.reconcile_devices()
+        return changes.added, changes.removed
 
-        new_devices = []
-        deleted_devices = []
-        for device in full_set.values():
-            if device.identifier in self.device_map:
-                continue
-            self.device_map[device.identifier] = device
-            new_devices.append(device)
-            # assume newly discovered devices are offline by default
-            self.offline_devices[device.identifier] = OfflineDevice(device=device, last_update=datetime.now())
+    def reconcile_devices(self) -> DeviceChanges:
+        """
+        Fetch the host list and apply it to the known devices.
 
-        # check for deleted devices
-        for device_id, device in self.device_map.items():
-            if device is UnknownDevice:
-                continue
-            if device_id not in full_set:
-                # device has been removed
-                deleted_devices.append(device)
-
-        for device in deleted_devices:
-            del self.device_map[device.identifier]
-
-        return new_devices, deleted_devices
+        Records are compared by digest, so unchanged devices are skipped without building a Device.
+        Changed records update the existing Device in place, keeping its state and the objects
+        listeners hold on to.
+        """
+        records = self.device_repository.get_device_records()
 
-    def refresh(self):
-        if self.mq is not None:
-            self.mq.stop()
-            self.mq = None
-
-        self.api.sign_in()
-
-        sharing_mq = MessageBroker(api=self.api, host=self.domain, port=17670)
+        new_devices = []
+        updated_devices = []
+        relaid_devices = []
+        deleted_devices = []
+        # The records are fetched above without any lock; applying them touches the same per-device
+        # state as on_receive and happens under the receive lock.
+        with self._receive_lock:
+            # The diff runs against the draft so that concurrent callers (setup in the
+            # executor and the broker thread) never both report the same device.
+            with self._devices.edit() as device_map:
+                known = {
+                    device.id: device for device in device_map.values() if device is not UnknownDevice
+                }
+                seen = set()
+                for record in records:
+                    device_id = record.get("id")
+                    seen.add(device_id)
+                    digest = _record_digest(record)
+                    existing = known.get(device_id)
+                    if existing is not None and self._record_digests.get(device_id) == digest:
+                        continue
+                    self._record_digests[device_id] = digest
+
+                    device = Device.init_from(record, self)
+                    if existing is None:
+                        device_map[device.identifier] = device
+                        new_devices.append(device)
+                        self._attach_history(device)
+                        continue
+
+                    if existing.update_from(device):
+                        relaid_devices.append(existing)
+                        self._attach_history(existing)
+                    updated_devices.append(existing)
+
+                # check for deleted devices
+                for identifier, device in list(device_map.items()):
+                    if device is UnknownDevice:
+                        continue
+                    if device.id not in seen:
+                        # device has been removed
+                        deleted_devices.append(device)
+                        del device_map[identifier]
+                        self._record_digests.pop(device.id, None)
+                        self.refresh_scheduler.forget(identifier)
+                        self._suspects.pop(identifier, None)
+                        self._last_frames.pop(identifier, None)
+
+            now = datetime.now()
+            with self._offline_devices.edit() as offline_devices:
+                for device in new_devices:
+                    # assume newly discovered devices are offline by default
+                    offline_devices[device.identifier] = OfflineDevice(device=device, last_update=now)
+                for device in deleted_devices:
+                    offline_devices.pop(device.identifier, None)
+
+        return DeviceChanges(
+            added=new_devices,
+            updated=updated_devices,
+            layout_changed=relaid_devices,
+            removed=deleted_devices,
+        )
+
+    def sync_devices(self) -> DeviceChanges:
+        """Reconcile the device list and report every change to the entity listener."""
+        changes = self.reconcile_devices()
+        relaid = {id(device) for device in changes.layout_changed}
+        for device in changes.added:
+            self.entity_listener.on_device_added(device)
+        for device in changes.updated:
+            self.entity_listener.on_device_updated(device, id(device) in relaid)
+        for device in changes.removed:
+            self.entity_listener.on_device_removed(device)
+        if changes:
+            logger.debug(
+                "Device list reconciled: %d added, %d updated, %d removed",
+                len(changes.added), len(changes.updated), len(changes.removed),
+            )
+        return changes
+
+    def refresh_stale_devices(self) -> int:
+        """
+        Ask devices that have been silent for too long for their status (see client.refresh).
+        Offline devices are left to check_offline_devices. Returns the number of requests sent.
+        """
+        self.expire_suspects()
+        if not self.mq:
+            return 0
+        offline_devices = self.offline_devices
+        candidates = [
+            (identifier, device) for identifier, device in self.device_map.items()
+            if device is not UnknownDevice and identifier not in offline_devices
+        ]
+        # The scheduler is shared with the receive threads; the requests go out after the lock is released
+        with self._receive_lock:
+            due = self.refresh_scheduler.due(candidates, time.monotonic())
+        for device in due:
+            self.send_command(device.status_command())
+        if due:
+            logger.debug("Requested the status of %d silent devices", len(due))
+        return len(due)
+
+    def _attach_history(self, device: 'Device') -> None:
+        if self.history_size > 0 and device.entities:
+            slots = max(entity.id for entity in device.entities) + 1
+            device.history = StateHistory(slots=slots, capacity=self.history_size)
+
+    def refresh(self, handover: bool = True):
+        """
+        (Re)connect the broker. With `handover` and a live connection, the new connection is
+        opened and authenticated first and the old one is only closed after the switch
+        (make-before-break), so no frames are missed.
+        """
+        previous_mq = self.mq
+        if previous_mq is not None and not (handover and previous_mq.connected):
+            previous_mq.stop()
+            self.mq = previous_mq = None
+        self._connecting_mq = None  # broker of a refresh that has not finished connecting yet
+
+        if self.daemon_socket:
+            sharing_mq = IpcBroker(self.daemon_socket, buffer_size=self.buffer_size,
+                                   retry_interval=self.retry_interval, batch_interval=self.batch_interval,
+                                   tracer=self.tracer, outbox=self.outbox, metrics=self.metrics,
+                                   on_devices_changed=self._on_daemon_devices_changed)
+        else:
+            self.api.sign_in()
+            sharing_mq = self._new_broker()
         sharing_mq.add_message_handler(self)
-        sharing_mq.connect()
+        self._connecting_mq = sharing_mq
+        try:
+            connected = sharing_mq.connect(attempts=HANDOVER_ATTEMPTS if previous_mq is not None else None)
+        finally:
+            self._connecting_mq = None
+        if not connected:
+            # stop() was called while connecting, or the replacement failed and the current connection stays
+            sharing_mq.stop()
+            if previous_mq is not None and self.mq is previous_mq:
+                logger.warning("Could not open a replacement connection, keeping the current one")
+            return
+        if previous_mq is not None:
+            # The server may drop the old connection now that the new one authenticated; it must not fight back.
+            # Cleared only now, so the old connection still recovers from drops while the new one fails to connect.
+            previous_mq.reconnect = False
+            # Both connections deliver frames until the old one is stopped; repeated statuses are ignored.
+            # Ask one device per home for its status so the new connection(s) prove they are authenticated.
+            homes = {device.home_id: device for device in self.device_map.values() if device is not UnknownDevice}
+            for device in homes.values():
+                sharing_mq.send_message(Message(device.status_command()))
+            if not sharing_mq.wait_until_receiving(HANDOVER_TIMEOUT):
+                logger.warning("No frames on the new connection after %s seconds, switching anyway", HANDOVER_TIMEOUT)
+
         self.mq = sharing_mq
 
-        for device in list(self.device_map.values()):
+        if previous_mq is not None:
+            previous_mq.stop()
+            # Commands the old connection could no longer write during the switch
+            sharing_mq.flush_outbox()
+            logger.info("Handed over to a new connection")
+            return
+
+        for device in self.device_map.values():
             if device is UnknownDevice:
                 continue
             self.send_command(device.status_command())
 
+    def refresh_expired_token(self) -> bool:
+        """
+        Sign in again on a new connection once the token is older than `token_max_age`, handing over
+        without a gap (see refresh). Meant to be called periodically; returns whether it refreshed.
+        """
+        mq = self.mq
+        if self.daemon_socket or mq is None or not mq.connected or self._connecting_mq is not None:
+            return False
+        if not self.api.token_expired:
+            return False
+        logger.info("Token is older than %s, handing over to a new connection", self.api.token_max_age)
+        try:
+            self.refresh(handover=True)
+        except Exception as e:  # e.g. the sign in failed; the current connection keeps working
+            logger.warning("Failed to refresh the connection: %s", e)
+            return False
+        return True
+
+    def _new_broker(self) -> MessageBroker | ShardedBroker:
+        """A broker for the cloud connection, split over several connections if so configured."""
+        if self.broker_connections > 1:
+            homes: dict[str, int] = {}
+            for device in self.device_map.values():
+                if device is not UnknownDevice:
+                    homes[device.home_id] = homes.get(device.home_id, 0) + 1
+            shard_homes = partition_homes(homes, self.broker_connections)
+            if len(shard_homes) > 1:
+                self._home_shards = {home: index for index, home in enumerate(shard_homes)}
+                shards = []
+                for index, home in enumerate(shard_homes):
+                    # Each connection buffers its own failed writes, so they are retried on the same connection
+                    shard_outbox = OutboundBuffer(key=command_key, ttl=self.outbox.ttl, max_size=self.outbox.max_size)
+                    shards.append(self._cloud_broker(home_id=home, outbox=shard_outbox, name=f"TCPMessageQueue-{index}"))
+                logger.info("Using %d connections for %d homes", len(shards), len(homes))
+                return ShardedBroker(shards, route=self._route_frame, outbox=self.outbox)
+        return self._cloud_broker()
+
+    def _cloud_broker(self, home_id: str | None = None, outbox: OutboundBuffer | None = None,
+                      name: str = "TCPMessageQueue") -> MessageBroker:
+        return MessageBroker(api=self.api, host=self.domain, port=self.broker_port, name=name,
+                             buffer_size=self.buffer_size, retry_interval=self.retry_interval,
+                             batch_interval=self.batch_interval, tracer=self.tracer,
+                             outbox=outbox if outbox is not None else self.outbox,
+                             resolver=self.resolver, metrics=self.metrics, home_id=home_id)
+
+    def _route_frame(self, data: bytes) -> int:
+        """Index of the connection that carries the home of the device a frame is addressed to."""
+        # Homes without a connection of their own (and unknown devices) use the one covering every home
+        shared = self._home_shards.get(None, 0)
+        device = self.device_map.get(tuple(data[COMMAND_IDENTIFIER]))
+        if device is None or device is UnknownDevice:
+            return shared
+        return self._home_shards.get(device.home_id, shared)
+
+    def _on_daemon_devices_changed(self) -> None:
+        try:
+            self.sync_devices()
+        except Exception as e:  # the next change or the periodic sync retries
+            logger.warning("Failed to fetch the device list from the daemon: %s", e)
+
+    def status_snapshot(self) -> dict[str, str]:
+        """Last status frame of every device, keyed by device id, suitable for persisting."""
+        return {
+            device.id: device._status.hex()
+            for device in self.device_map.values()
+            if device is not UnknownDevice and device._status is not None
+        }
+
+    def restore_status_snapshot(self, snapshot: Mapping[str, str]) -> int:
+        """Rehydrate statuses produced by `status_snapshot`. Returns the number of restored devices."""
+        restored = 0
+        for device in self.device_map.values():
+            if device is UnknownDevice or device.id not in snapshot:
+                continue
+            try:
+                response = bytes.fromhex(snapshot[device.id])
+            except (TypeError, ValueError):
+                continue
+            if device.restore_status(response):
+                restored += 1
+        return restored
+
+    def request_status(self, device: 'Device', force: bool = False) -> bool:
+        """
+        Ask a device without any known status for its status, or any device with `force`.
+        Requests for the same device are throttled, so callers may invoke this once per entity.
+        """
+        if (device._status is not None and not force) or not self.mq:
+            return False
+        now = time.monotonic()
+        requested_at = self._status_requested_at.get(device.identifier)
+        if requested_at is not None and now - requested_at < STATUS_REQUEST_INTERVAL:
+            return False
+        self._status_requested_at[device.identifier] = now
+        self.send_command(device.status_command())
+        return True
+
+    @property
+    def is_started(self) -> bool:
+        """Whether a broker is connected or still connecting."""
+        return self.mq is not None or self._connecting_mq is not None
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """
+        Stop the broker, including one that is still connecting.
+        With a timeout, wait for the broker thread to finish and return whether it did in time.
+        """
+        stopped = True
+        for mq in (self._connecting_mq, self.mq):
+            if mq is not None:
+                stopped = mq.stop(timeout) and stopped
+        self.mq = None
+        self._event_hub.close()
+        with self._writer_lock:
+            if self._writer is not None and self._writer.is_alive():
+                self._outbound.put(None)
+            self._writer = None
+        return stopped
+
+    def apply_tuning(self,
+                     retry_interval: float | None = None,
+                     batch_interval: float | None = None,
+                     buffer_size: int | None = None,
+                     token_max_age: timedelta | None = None,
+                     offline_probe_interval: float | None = None,
+                     offline_after_frames: int | None = None,
+                     offline_after_seconds: float | None = None) -> None:
+        """Change tuning knobs of a running manager. Arguments left as None are kept."""
+        if retry_interval is not None:
+            self.retry_interval = retry_interval
+        if batch_interval is not None:
+            self.batch_interval = batch_interval
+        if buffer_size is not None:
+            self.buffer_size = buffer_size
+        if token_max_age is not None:
+            self.api.token_max_age = token_max_age
+        if offline_probe_interval is not None:
+            self.offline_probe_interval = offline_probe_interval
+        if offline_after_frames is not None:
+            self.offline_after_frames = offline_after_frames
+        if offline_after_seconds is not None:
+            self.offline_after_seconds = offline_after_seconds
+
+        for mq in (self._connecting_mq, self.mq):
+            if mq is not None:
+                mq.retry_interval = self.retry_interval
+                mq.batch_interval = self.batch_interval
+                mq.buffer_size = self.buffer_size
+
+    def configure_tracing(self, sample_rate: int = 1, device_ids: Iterable[str] | None = None) -> None:
+        """
+        Limit frame tracing (see client.trace) to one in `sample_rate` frames of the given devices.
+        Device ids that are not known are ignored; None traces every device.
+        """
+        devices = None
+        if device_ids is not None:
+            wanted = set(device_ids)
+            devices = [
+                identifier for identifier, device in self.device_map.items()
+                if device is not UnknownDevice and device.id in wanted
+            ]
+        self.tracer.configure(sample_rate, devices)
+
     def check_offline_devices(self):
+        now = datetime.now()
+        probe_interval = timedelta(seconds=self.offline_probe_interval)
         for offline_device in self.offline_devices.values():
-            offline_device.last_update = datetime.now()
+            if probe_interval and now - offline_device.last_update < probe_interval:
+                continue
+            offline_device.last_update = now
             self.send_command(offline_device.device.status_command())
+        self.expire_suspects()
+
+    def expire_suspects(self) -> int:
+        """
+        Take devices offline whose offline report was held back for `offline_after_seconds`.
+        Runs on every frame and from refresh_stale_devices, so a quiet connection expires them too.
+        """
+        if not self._suspects:
+            return 0
+        now = time.monotonic()
+        expired = 0
+        with self._receive_lock:
+            for identifier, suspect in list(self._suspects.items()):
+                if now - suspect.since >= self.offline_after_seconds and self._suspects.pop(identifier, None):
+                    self._apply_status(suspect.device, suspect.status)
+                    expired += 1
+        return expired
+
+    def _hold_offline_status(self, identifier: tuple, device: 'Device', status: bytes) -> bool:
+        """
+        Debounce availability: an offline report of an online device is held back until it repeats
+        `offline_after_frames` times or persists for `offline_after_seconds`. Online reports apply at once.
+        Returns whether the frame was held back. Called with the receive lock held.
+        """
+        if not device.reports_offline(status):
+            self._suspects.pop(identifier, None)
+            return False
+        if device.offline or self.offline_after_frames <= 1:
+            return False
+
+        now = time.monotonic()
+        suspect = self._suspects.get(identifier)
+        if suspect is None:
+            suspect = self._suspects[identifier] = SuspectDevice(device=device, since=now, frames=0, status=status)
+        suspect.frames += 1
+        suspect.status = status
+        if suspect.frames >= self.offline_after_frames or now - suspect.since >= self.offline_after_seconds:
+            self._suspects.pop(identifier, None)
+            return False
+        return True
+
+    def _is_duplicate(self, identifier: tuple, data: bytes, now: float) -> bool:
+        """
+        Whether the frame repeats the device's previous one within DUPLICATE_WINDOW. Such a repeat is the
+        same push delivered by a second connection; counting it would double an offline report in the
+        debounce and give the refresh scheduler a near-zero interval. A probe answered with the same
+        status takes a round trip to the device and arrives later. Called with the receive lock held.
+        """
+        last = self._last_frames.get(identifier)
+        self._last_frames[identifier] = (data, now)
+        return last is not None and last[0] == data and now - last[1] < DUPLICATE_WINDOW
 
     def on_receive(self, message: Message):
         self.check_offline_devices()
         if not message.is_status:
             return
 
-        device = self.device_map.get(message.device_identifier)
+        identifier = message.device_identifier
+        device = self.device_map.get(identifier)
 
         if device is UnknownDevice:
             return
 
         if device is None:
-            self.device_map[message.device_identifier] = UnknownDevice
             # Got update on a device which we don't have.
             # This could indicate a new device being added.
-            try:
-                new_devices, deleted_devices = self.get_devices()
-                for device in new_devices:
-                    self.entity_listener.on_device_added(device)
-                for device in deleted_devices:
-                    self.entity_listener.on_device_removed(device)
-
-                if new_devices:
-                    # try again
-                    return self.on_receive(message)
-            except (ConnectionError, RequestException) as e:
-                logger.warning(
-                    "Failed to fetch device list due to connection error: %s. "
-                    "Will retry on next message.",
-                    e
-                )
-                # Don't remove UnknownDevice marker so we can retry later
-                return
-            except Exception as e:
-                logger.error("Unexpected error while fetching device list: %s", e, exc_info=True)
-                return
-            # do nothing
+            self._look_up_unknown_device(message)
             return
 
         # remove checksum info
@@ -151,18 +621,175 @@ class Manager(MessageHandler):
         data[4] = 0
         data[-1] = 0
         data[-2] = 0
+        status = bytes(data)
 
-        changed_entities = device.set_current_status_response(bytes(data))
+        now = time.monotonic()
+        with self._receive_lock:
+            if self._is_duplicate(identifier, message.data, now):
+                return
+            self.refresh_scheduler.on_frame(identifier, device, now)
+            held = self._hold_offline_status(identifier, device, status)
+            if not held:
+                self._apply_status(device, status)
+        if held:
+            # Ask again rather than waiting for the next push
+            self.request_status(device, force=True)
+
+    def _look_up_unknown_device(self, message: Message) -> None:
+        """
+        Fetch the device list on a worker thread, so the receive thread (and every home on its connection)
+        never waits on the cloud. The latest frame of each unknown device is handled again once it is known.
+        """
+        identifier = message.device_identifier
+        self._devices.set(identifier, UnknownDevice)
+        with self._lookup_lock:
+            self._unknown_frames[identifier] = message
+            if self._lookup is not None:
+                return  # the running lookup picks the frame up
+            self._lookup = threading.Thread(target=self._look_up_unknown_devices, name="HigoalLookup", daemon=True)
+            self._lookup.start()
+
+    def _look_up_unknown_devices(self) -> None:
+        while True:
+            with self._lookup_lock:
+                frames, self._unknown_frames = self._unknown_frames, {}
+                if not frames:
+                    self._lookup = None
+                    return
+            try:
+                changes = self.sync_devices()
+            except (ConnectionError, RequestException) as e:
+                # The UnknownDevice markers stay, the devices are picked up by the next sync
+                logger.warning("Failed to fetch device list due to connection error: %s", e)
+                continue
+            except Exception as e:
+                logger.error("Unexpected error while fetching device list: %s", e, exc_info=True)
+                continue
+            if not changes.added:
+                continue
+            device_map = self.device_map
+            for identifier, message in frames.items():
+                if device_map.get(identifier) not in (None, UnknownDevice):
+                    self.on_receive(message)
+
+    def _apply_status(self, device: 'Device', status: bytes) -> None:
+        publish_events = self._event_hub.has_subscribers
+        if publish_events:
+            received_at = time.time()
+            previous_states = {entity.id: entity.state for entity in device.entities}
+
+        changed_entities = device.set_current_status_response(status)
+        if changed_entities:
+            self.entity_listener.on_entities_changed(device, changed_entities)
         for entity in changed_entities:
-            self.entity_listener.on_entity_changed(entity)
+            if publish_events:
+                self._event_hub.publish(EntityChangeEvent(
+                    device_id=device.id,
+                    device_identifier=device.identifier,
+                    entity_id=entity.id,
+                    old_state=previous_states.get(entity.id),
+                    new_state=entity.state,
+                    timestamp=received_at,
+                ))
 
         # if one of the entities is offline
         if device.offline:
-            self.offline_devices[device.identifier] = OfflineDevice(device=device, last_update=datetime.now())
-        elif device.identifier in self.offline_devices:
-            del self.offline_devices[device.identifier]
+            if device.identifier not in self._offline_devices:
+                self._offline_devices.set(device.identifier, OfflineDevice(device=device, last_update=datetime.now()))
+        elif device.identifier in self._offline_devices:
+            self._offline_devices.pop(device.identifier)
+
+    def subscribe(self, maxsize: int = DEFAULT_QUEUE_SIZE,
+                  policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST) -> Subscription:
+        """
+        Subscribe to entity changes from within a running event loop.
+
+        Iterate the returned subscription with `async for` and close it (or use it as an async context manager)
+        when done. Each subscriber gets its own bounded buffer, handled according to `policy` when full.
+        """
+        return self._event_hub.subscribe(maxsize=maxsize, policy=policy)
 
     def send_command(self, data: bytes):
         if not self.mq:
+            # Connecting: the broker flushes the outbox once authenticated. Status requests are
+            # not kept, refresh() asks every device once connected.
+            if data and not is_status_request(data):
+                self.outbox.put(data)
             return
         self.mq.send_message(Message(data))
+
+    def find_entity(self, device_id: str, entity_id: int) -> 'Entity | None':
+        """Find an entity by the id of its device and its button index."""
+        for device in self.device_map.values():
+            if device is UnknownDevice or device.id != device_id:
+                continue
+            for entity in device.entities:
+                if entity.id == entity_id:
+                    return entity
+        return None
+
+    def build_bulk_commands(self, actions: Iterable[tuple['Entity', str]]) -> list[bytes]:
+        """
+        Encode (entity, action) pairs into one frame per button, dropping duplicates.
+
+        Shutter buttons are skipped: their on and off commands are the same toggle frame, so turning
+        them "off" would move them.
+        """
+        frames: list[bytes] = []
+        for entity, action in actions:
+            if entity.type == TYPE_SHUTTER:
+                logger.debug("Skipping shutter %s in a bulk command", entity)
+                continue
+            cmd = entity.command_for(action)
+            if not cmd:
+                logger.warning("Unsupported action %s for %s", action, entity)
+                continue
+            if cmd not in frames:
+                frames.append(cmd)
+        return frames
+
+    def send_bulk(self, actions: Iterable[tuple['Entity', str]]) -> int:
+        """Send a group of actions as a single paced batch. Returns the number of frames sent."""
+        return self.send_frames(self.build_bulk_commands(actions))
+
+    def queue_frames(self, frames: Iterable[bytes]) -> None:
+        """
+        Hand frames to the writer thread and return at once, so callers on an event loop neither block
+        nor tie up a thread per action. Frames queued while the writer is busy go out as one paced batch.
+        """
+        for frame in frames:
+            if frame:
+                self._outbound.put(frame)
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_frames, name="HigoalWriter", daemon=True)
+                self._writer.start()
+
+    def _write_frames(self) -> None:
+        stopping = False
+        while not stopping and (frame := self._outbound.get()) is not None:
+            frames = [frame]
+            while True:
+                try:
+                    frame = self._outbound.get_nowait()
+                except queue.Empty:
+                    break
+                if frame is None:
+                    stopping = True
+                    break
+                frames.append(frame)
+            try:
+                self.send_frames(frames)
+            except Exception as e:
+                logger.error("Failed to send %d queued frames: %s", len(frames), e)
+
+    def send_frames(self, frames: list[bytes]) -> int:
+        """Send frames as a single paced batch. Returns the number of frames sent."""
+        if not frames:
+            return 0
+        if not self.mq:
+            for frame in frames:
+                if not is_status_request(frame):
+                    self.outbox.put(frame)
+            return 0
+        return self.mq.send_messages([Message(frame) for frame in frames])
@@ -0,0 +1,85 @@
+"""
+In-process metrics of the client.
+
+A small, thread-safe registry of counters, gauges and latency observations that
+the client components report into. Nothing is exported on its own; `snapshot()`
+returns plain data for whoever wants to show it (diagnostics, logs, scripts).
+"""
+
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+LATENCY_WINDOW = 256  # recent observations kept per latency for the percentiles
+
+
+@dataclass
+class LatencyStats:
+    """Aggregates of one latency, in seconds."""
+
+    count: int = 0
+    total: float = 0.0
+    min: float | None = None
+    max: float | None = None
+    recent: deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW), repr=False)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def percentile(self, fraction: float) -> float | None:
+        """Percentile over the recent observations."""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+        }
+
+
+class Metrics:
+    """Counters, gauges and latencies by name."""
+
+    def __init__(self):
+        self._counters: dict[str, int] = {}
+        self._gauges: dict[str, object] = {}
+        self._latencies: dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name: str, value) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self._latencies.get(name)
+            if stats is None:
+                stats = self._latencies[name] = LatencyStats()
+            stats.observe(seconds)
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """Current values as plain data."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "latencies": {name: stats.as_dict() for name, stats in self._latencies.items()},
+            }
@@ -13,12 +13,29 @@ from abc import ABC, abstractmethod
 from typing import Optional
 
 from .api import Api
+from .connect import CONNECT_TIMEOUT, Resolver, open_connection
+from .device import _STATUS_OFFSET
+from .metrics import Metrics
+from .outbox import OutboundBuffer
+from .trace import DIRECTION_IN, DIRECTION_OUT, FrameTracer
 from .utils import generate_auth_command
 
 logger = logging.getLogger(__name__)
 
 RETRY_INTERVAL = 5.0
 SEND_MESSAGE_INTERVAL = 0.250  # 250 milliseconds
+BATCH_MESSAGE_INTERVAL = 0.020  # 20 milliseconds between frames of a batch
+
+MESSAGE_SIZE = 48
+STATUS_HEADER = (187, 91)
+PING_HEADER = (204, 92)
+STATUS_IDENTIFIER = slice(9, 13)  # device identifier bytes of a status frame
+PING_IDENTIFIER = slice(3, 7)  # device identifier bytes of a ping frame
+COMMAND_IDENTIFIER = STATUS_IDENTIFIER  # device identifier bytes of an outbound command
+AUTH_COMMAND_TYPE = 240  # byte 6 of the auth frame, which carries token bytes where commands carry the device
+COMMAND_MODE_OFFSET = 7  # 1 for status requests, 2 for commands that change a button
+COMMAND_MODE_READ = 1
+MAX_BUTTONS = 8
 
 
 class Message:
@@ -26,10 +43,10 @@ class Message:
 
     def __init__(self, data: bytes = None):
         if data is None:
-            self.data = bytes(48)  # Initialize with 48 zero bytes
+            self.data = bytes(MESSAGE_SIZE)  # Initialize with 48 zero bytes
         else:
-            if len(data) != 48:
-                raise ValueError(f"Message must be exactly 48 bytes, got {len(data)}")
+            if len(data) != MESSAGE_SIZE:
+                raise ValueError(f"Message must be exactly {MESSAGE_SIZE} bytes, got {len(data)}")
             self.data = data
 
     def __bytes__(self) -> bytes:
@@ -47,22 +64,36 @@ class Message:
 
     @property
     def is_status(self):
-        return self.data[0] == 187 and self.data[1] == 91
+        return (self.data[0], self.data[1]) == STATUS_HEADER
 
     @property
     def is_ping(self):
-        return self.data[0] == 204 and self.data[1] == 92
+        return (self.data[0], self.data[1]) == PING_HEADER
 
     @property
     def device_identifier(self):
         if self.is_status:
-            return self.data[9], self.data[10], self.data[11], self.data[12]
+            return tuple(self.data[STATUS_IDENTIFIER])
         elif self.is_ping:
-            return self.data[3], self.data[4], self.data[5], self.data[6]
+            return tuple(self.data[PING_IDENTIFIER])
         else:
             return None
 
 
+def is_status_request(data: bytes) -> bool:
+    return data[COMMAND_MODE_OFFSET] == COMMAND_MODE_READ
+
+
+def command_key(data: bytes) -> tuple:
+    """The device and buttons an outbound command addresses; a newer command with the same key supersedes it."""
+    device = bytes(data[COMMAND_IDENTIFIER])
+    if is_status_request(data):
+        return device, None
+    return device, tuple(
+        index for index in range(MAX_BUTTONS) if data[_STATUS_OFFSET + index]
+    )
+
+
 class MessageHandler(ABC):
     """Abstract base class for message handlers."""
 
@@ -76,34 +107,61 @@ class MessageBroker(threading.Thread):
     """TCP Socket-based Message Queue implementation that runs in a separate thread."""
 
     def __init__(self, api: Api, host: str = "server.higoal.net", port: int = 17670,
-                 buffer_size: int = 8192, name: str = "TCPMessageQueue"):
+                 buffer_size: int = 8192, name: str = "TCPMessageQueue",
+                 retry_interval: float = RETRY_INTERVAL,
+                 batch_interval: float = BATCH_MESSAGE_INTERVAL,
+                 tracer: FrameTracer | None = None,
+                 outbox: OutboundBuffer | None = None,
+                 resolver: Resolver | None = None,
+                 metrics: Metrics | None = None,
+                 home_id: str | None = None):
         super().__init__(name=name, daemon=True)
 
         self.host = host
         self.port = port
         self.buffer_size = buffer_size
+        self.retry_interval = retry_interval
+        self.batch_interval = batch_interval
+        self.home_id = home_id  # authenticate for this home only, None for every home of the user
+        self.tracer = tracer if tracer is not None else FrameTracer()
+        # Commands sent while disconnected, flushed after the next successful auth
+        self.outbox = outbox if outbox is not None else OutboundBuffer(key=command_key)
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Shared with later brokers so reconnects reuse the resolved addresses
+        self.resolver = resolver if resolver is not None else Resolver(metrics=self.metrics)
 
         self.socket: Optional[socket.socket] = None
         self.connected = False
         self.running = False
+        self.reconnect = True  # cleared while a replacement connection takes over, see Manager.refresh
         self.api = api
         self.message_handlers: dict[int, Optional[MessageHandler]] = {}
 
         # Thread control
         self._stop_event = threading.Event()
         self._lock = threading.Lock()
+        self._receiving = threading.Event()  # set by the first frame read on the current socket
+
+    @property
+    def endpoint(self) -> str:
+        """Where the broker connects to, for logging."""
+        return f"{self.host}:{self.port}"
 
     def add_message_handler(self, handler: MessageHandler) -> None:
         """Set the message handler for incoming messages."""
         with self._lock:
             self.message_handlers[id(handler)] = handler
 
-    def connect(self, retry_interval: float = RETRY_INTERVAL) -> bool:
+    def connect(self, retry_interval: float | None = None, attempts: int | None = None) -> bool:
         """Connect to the TCP server, retrying until successful or stop() is called.
 
         Returns True once the connection is established, or False if the
-        broker was stopped (_stop_event set) before it could connect.
+        broker was stopped (_stop_event set) before it could connect, or
+        `attempts` attempts failed.
         """
+        if retry_interval is None:
+            retry_interval = self.retry_interval
+        failures = 0
         while not self._stop_event.is_set():
             try:
                 with self._lock:
@@ -111,18 +169,22 @@ class MessageBroker(threading.Thread):
                         logger.warning("Already connected")
                         return True
 
-                    # Create a fresh socket each attempt
-                    self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    self.socket.settimeout(10.0)
-                    self.socket.connect((self.host, self.port))
-                    self.socket.settimeout(None)
+                # Resolve and connect without the lock, senders only wait for the socket swap
+                sock, address = self._open_socket()
+                with self._lock:
+                    if self.connected:
+                        sock.close()
+                        logger.warning("Already connected")
+                        return True
 
+                    self._receiving.clear()
+                    self.socket = sock
                     self.connected = True
                     self.running = True
                     if not self.is_alive():
                         self.start()
 
-                    logger.info("Connected to %s:%s", self.host, self.port)
+                    logger.info("Connected to %s (%s)", self.endpoint, address[0])
 
                 # Out of the lock: perform any post‑connect work
                 try:
@@ -139,15 +201,18 @@ class MessageBroker(threading.Thread):
                                 pass
                             self.socket = None
                     # Continue to retry loop
+                    failures += 1
+                    if attempts is not None and failures >= attempts:
+                        return False
                     if self._stop_event.wait(retry_interval):
                         break
-                    logger.debug("Retrying connection to %s:%s …", self.host, self.port)
+                    logger.debug("Retrying connection to %s …", self.endpoint)
                     continue
                 
                 return True
 
             except Exception as e:
-                logger.error("Failed to connect TCP socket to %s:%s: %s", self.host, self.port, e)
+                logger.error("Failed to connect to %s: %s", self.endpoint, e)
 
                 # Clean up the failed socket and mark as disconnected
                 with self._lock:
@@ -159,14 +224,45 @@ class MessageBroker(threading.Thread):
                             pass
                         self.socket = None
 
+            failures += 1
+            if attempts is not None and failures >= attempts:
+                return False
             # Wait before the next attempt (returns early if stop_event is set)
             if self._stop_event.wait(retry_interval):
                 break  # stop() was called – give up
 
-            logger.debug("Retrying connection to %s:%s …", self.host, self.port)
+            logger.debug("Retrying connection to %s …", self.endpoint)
 
         return False
 
+    def _open_socket(self) -> tuple[socket.socket, tuple]:
+        """Connect a fresh socket to the fastest reachable address of the host."""
+        addresses = self.resolver.resolve(self.host, self.port)
+        self.metrics.increment("broker.connect.attempts")
+        started = time.monotonic()
+        try:
+            sock, address = open_connection(addresses, CONNECT_TIMEOUT)
+        except OSError:
+            self.metrics.increment("broker.connect.failures")
+            # None of the addresses answered, they may be outdated
+            self.resolver.invalidate(self.host, self.port)
+            raise
+        self.metrics.observe("broker.connect", time.monotonic() - started)
+        self.metrics.set("broker.address", address[0])
+        return sock, address
+
+    def wait_until_receiving(self, timeout: float) -> bool:
+        """
+        Wait for the first frame on the current connection, the only sign that the server accepted
+        the auth frame. Returns False on timeout or when stopped.
+        """
+        deadline = time.monotonic() + timeout
+        while not self._receiving.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.wait(min(remaining, 0.05)):
+                return False
+        return True
+
     def disconnect(self) -> None:
         """Disconnect from the TCP server."""
         with self._lock:
@@ -175,6 +271,11 @@ class MessageBroker(threading.Thread):
             self.running = False
 
             if self.socket:
+                try:
+                    # shutdown() wakes up a recv() blocked in the receive thread, close() alone does not.
+                    self.socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
                 try:
                     self.socket.close()
                 except Exception as e:
@@ -185,12 +286,49 @@ class MessageBroker(threading.Thread):
         logger.info("Disconnected from server")
 
     def send_message(self, message: Message) -> bool:
-        """Send a message through the socket."""
+        """Send a message through the socket. While disconnected it is buffered for the next connection."""
         if not self.connected:
-            logger.warning("Not connected to server")
+            if self._buffer(message.data):
+                logger.warning("Not connected to server, buffering the message")
             return False
 
-        return self._send_message_internal(message)
+        if self._send_message_internal(message):
+            return True
+        self._buffer(message.data)
+        return False
+
+    def _buffer(self, data: bytes) -> bool:
+        """
+        Keep a frame for the next connection. Status requests are dropped like in Manager.send_command:
+        the connection asks every device once it is up, and probes must not evict button presses.
+        """
+        if is_status_request(data):
+            return False
+        self.outbox.put(data)
+        return True
+
+    def send_messages(self, messages: list[Message], interval: float | None = None) -> int:
+        """Send a batch of messages, pacing consecutive frames by `interval` seconds (default: batch_interval).
+
+        The lock is only held while a single frame is written, so other senders can
+        interleave with a long batch. Returns the number of frames that were sent.
+        """
+        if interval is None:
+            interval = self.batch_interval
+        sent = 0
+        for index, message in enumerate(messages):
+            if not self.connected:
+                logger.warning("Not connected to server, buffering %d queued messages", len(messages) - index)
+                for pending in messages[index:]:
+                    self._buffer(pending.data)
+                break
+            if index and interval > 0 and self._stop_event.wait(interval):
+                break
+            if self._send_message_internal(message):
+                sent += 1
+            else:
+                self._buffer(message.data)
+        return sent
 
     def _send_message_internal(self, message: Message) -> bool:
         """Internal method to send a message through the socket."""
@@ -200,7 +338,10 @@ class MessageBroker(threading.Thread):
                     return False
 
                 # Send the 48-byte message directly
-                logger.debug("Sending socket command: %s", message.data.hex())
+                if self.tracer.enabled:
+                    data = message.data
+                    device = None if data[6] == AUTH_COMMAND_TYPE else tuple(data[COMMAND_IDENTIFIER])
+                    self.tracer.trace(DIRECTION_OUT, data, device)
                 self.socket.sendall(message.data)
                 # Note: Removed sleep to avoid blocking the event loop.
                 # Rate limiting is handled by the natural flow of message processing.
@@ -219,7 +360,7 @@ class MessageBroker(threading.Thread):
                 except Exception as e:
                     logger.exception(f"Error in message handler: {e}")
         else:
-            logger.info(f"Received message: {message.data.hex()}")
+            logger.info("Received message: %s", message)
 
     def on_connect(self):
         # sign in if we haven't already
@@ -238,9 +379,22 @@ class MessageBroker(threading.Thread):
             self.disconnect()
             return
         
-        auth_command = generate_auth_command(token)
-        logger.debug("Sending auth command: %s", bytes(auth_command).hex())
-        self.send_message(Message(auth_command))
+        auth_command = generate_auth_command(token, self.home_id)
+        logger.debug("Sending auth command")
+        # Not through send_message: an auth frame must never end up in the outbox
+        if self._send_message_internal(Message(auth_command)):
+            self.flush_outbox()
+
+    def flush_outbox(self) -> int:
+        """Send the buffered commands that have not expired, paced like a batch. Returns the number sent."""
+        frames = self.outbox.drain()
+        if not frames:
+            return 0
+        logger.debug("Sending %d buffered commands", len(frames))
+        # Leave the server a moment to process the auth frame first
+        if self._stop_event.wait(self.batch_interval):
+            return 0
+        return self.send_messages([Message(frame) for frame in frames])
 
     def on_disconnect(self):
         # reconnect
@@ -255,42 +409,62 @@ class MessageBroker(threading.Thread):
         logger.debug("start")
         super().start()
 
-    def stop(self):
+    def stop(self, timeout: float | None = None) -> bool:
         """Stop mqtt.
 
-        Stop mqtt thread
+        Stop mqtt thread. With a timeout, wait up to `timeout` seconds for the thread to
+        finish and return whether it did.
         """
         logger.debug("stop")
         self.message_handlers = {}
+        # Set the stop event first so the receive loop does not treat the closed socket as an error to recover from.
+        self._stop_event.set()
         try:
             self.disconnect()
         except Exception as e:
             logger.error("mq disconnect error %s", e)
-        self._stop_event.set()
+
+        if timeout is None or not self.is_alive() or threading.current_thread() is self:
+            return not self.is_alive()
+        self.join(timeout)
+        if self.is_alive():
+            logger.warning("Message queue thread did not stop within %.1f seconds", timeout)
+            return False
+        return True
 
     def run(self) -> None:
         """Main thread method for receiving messages."""
         logger.info(f"Message queue thread started for {self.host}:{self.port}")
+        # Up to buffer_size bytes are read at once; a burst of frames then costs a single recv
+        buffer = bytearray()
         while self.running and not self._stop_event.is_set():
             try:
-                # Read exactly 48 bytes
-                message_data = b''
-                while len(message_data) < 48:
-                    chunk = self.socket.recv(min(48 - len(message_data), self.buffer_size))
-                    if not chunk:
-                        logger.info("Server closed connection")
+                chunk = self.socket.recv(self.buffer_size)
+                if not chunk:
+                    logger.info("Server closed connection")
+                    buffer.clear()  # a partial frame of the old connection
+                    if self._stop_event.is_set() or not self.reconnect:
                         break
-                    message_data += chunk
+                    self.on_disconnect()
+                    continue
 
-                if len(message_data) == 48:
-                    logger.debug("Received socket command: %s", message_data.hex())
+                buffer += chunk
+                end = len(buffer) - len(buffer) % MESSAGE_SIZE
+                if not end:
+                    continue
+                self._receiving.set()
+                for offset in range(0, end, MESSAGE_SIZE):
+                    message_data = bytes(buffer[offset:offset + MESSAGE_SIZE])
                     message = Message(message_data)
+                    if self.tracer.enabled:
+                        self.tracer.trace(DIRECTION_IN, message_data, message.device_identifier)
                     self.on_receive(message)
-                else:
-                    self.on_disconnect()
-                    continue
+                del buffer[:end]
 
             except Exception as e:
+                buffer.clear()
+                if self._stop_event.is_set() or not self.reconnect:
+                    break
                 logger.error(f"Error in receive loop: {e}")
                 self.api.reset()
                 self.on_disconnect()
@@ -0,0 +1,58 @@
+"""
+Holds outbound commands while the broker is not connected.
+
+Commands are kept in arrival order and expire after a time to live, so a button
+pressed during a reconnect is still carried out, but one pressed minutes ago is
+not replayed. A newer command with the same key (see mq.command_key, one per
+device and button) replaces the older one, and the buffer is bounded: when full,
+the oldest command is dropped.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+
+DEFAULT_TTL = 30.0  # seconds a command stays worth sending
+DEFAULT_MAX_SIZE = 64
+
+
+class OutboundBuffer:
+    """Bounded, de-duplicating buffer of frames with a time to live."""
+
+    def __init__(self, key: Callable[[bytes], Hashable], ttl: float = DEFAULT_TTL, max_size: int = DEFAULT_MAX_SIZE):
+        self.key = key
+        self.ttl = ttl
+        self.max_size = max_size
+        self.dropped = 0  # expired or evicted before they could be sent
+        self._entries: OrderedDict[Hashable, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, data: bytes, now: float | None = None) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            self.dropped += 1
+            return
+        if now is None:
+            now = time.monotonic()
+        key = self.key(data)
+        with self._lock:
+            # Re-insert so the newest intent is also sent last
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl, data)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.dropped += 1
+
+    def drain(self, now: float | None = None) -> list[bytes]:
+        """Remove and return the commands that have not expired, oldest first."""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        frames = [data for expires_at, data in entries if expires_at > now]
+        self.dropped += len(entries) - len(frames)
+        return frames
@@ -0,0 +1,222 @@
+"""
+In-process sampling profiler for the client.
+
+A background thread periodically snapshots the stacks of all threads with
+`sys._current_frames()` and keeps those that run code of this integration: the
+broker receive thread, Manager callbacks and whatever executor thread is busy with
+e.g. `get_devices`. Nothing is instrumented, so the profiled code runs unchanged and
+profiling can be started and stopped on a live process.
+
+The result can be written as collapsed stacks (one `frame;frame;frame count` line
+per unique stack, the input format of flamegraph.pl, speedscope and similar tools)
+and summarised per function.
+
+Samples whose innermost frame is blocked in a wait (a socket read, a queue get, an
+event wait, a select) are counted as idle and kept apart: the broker threads spend
+most of their life there, and counting those samples as own time of e.g.
+`MessageBroker.run` would bury the functions that actually use the CPU. A frame
+only shows the Python caller of a C function such as `socket.recv`, so the call is
+recognised from the instruction the frame is executing. A thread switched out right
+after a quick call of the same name (a dict's `get`) is occasionally counted as idle too.
+"""
+
+import dis
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass
+from types import CodeType
+
+DEFAULT_INTERVAL = 0.01  # seconds between samples
+SUMMARY_MODULES = ("client.mq", "client.manager", "client.device")
+# Callables that block the calling thread until data, a timeout or a notification arrives
+BLOCKING_CALLS = frozenset({
+    "recv", "recv_into", "recvfrom", "accept", "select", "poll", "sleep", "wait", "acquire", "get",
+})
+_LOADS = frozenset({"LOAD_ATTR", "LOAD_METHOD", "LOAD_GLOBAL", "LOAD_NAME"})
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass(frozen=True, slots=True)
+class FunctionStats:
+    function: str
+    samples: int  # samples with the function anywhere on the stack
+    own_samples: int  # samples where it is the innermost function of the summarised files
+    share: float  # samples / total samples
+
+
+def _label(code: CodeType, package_dir: str) -> str:
+    """`client.mq:MessageBroker.run` for integration code, `socket.py:socket.recv` for anything else."""
+    filename = code.co_filename
+    if filename.startswith(package_dir + os.sep):
+        module = os.path.splitext(os.path.relpath(filename, package_dir))[0].replace(os.sep, ".")
+        return f"{module}:{code.co_qualname}"
+    return f"{os.path.basename(filename)}:{code.co_qualname}"
+
+
+def _call_targets(code: CodeType) -> dict[int, str]:
+    """
+    The name of the function each call instruction of `code` calls, by offset: `recv` for
+    `self.socket.recv(size)`. The callee is the last name loaded by the expression the call starts with.
+    """
+    loads = {}
+    targets = {}
+    for instruction in dis.get_instructions(code):
+        positions = instruction.positions
+        if positions is None or positions.lineno is None:
+            continue
+        start = (positions.lineno, positions.col_offset)
+        if instruction.opname in _LOADS:
+            loads[start] = instruction
+        elif instruction.opname.startswith("CALL") and (load := loads.get(start)) is not None:
+            targets[instruction.offset] = load.argval
+    return targets
+
+
+class ProfileResult:
+    """Collapsed stacks collected by a SamplingProfiler run."""
+
+    def __init__(self, stacks: Counter, samples: int, duration: float, idle: Counter | None = None):
+        self.stacks = stacks  # (thread name, outermost frame, ..., innermost frame) -> count
+        self.samples = samples  # number of snapshots taken, including those without integration code
+        self.duration = duration
+        self.idle = idle if idle is not None else Counter()  # same stacks, blocked in one of BLOCKING_CALLS
+
+    @property
+    def matched_samples(self) -> int:
+        return sum(self.stacks.values())
+
+    @property
+    def idle_samples(self) -> int:
+        return sum(self.idle.values())
+
+    def idle_summary(self, modules: Iterable[str] = SUMMARY_MODULES, top: int = 5) -> list[tuple[str, int]]:
+        """Where the idle samples waited: `client.mq:MessageBroker._read_frames -> recv` and the sample count."""
+        prefixes = tuple(f"{name}:" for name in modules)
+        waits = Counter()
+        for stack, count in self.idle.items():
+            relevant = [frame for frame in stack[1:-1] if frame.startswith(prefixes)]
+            waits[f"{relevant[-1] if relevant else stack[0]} -> {stack[-1]}"] += count
+        return waits.most_common(top)
+
+    def collapsed(self) -> str:
+        """The stacks in collapsed format, heaviest first."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.collapsed())
+
+    def summary(self, modules: Iterable[str] = SUMMARY_MODULES, top: int = 20) -> list[FunctionStats]:
+        """
+        The `top` functions of the given integration modules (e.g. `client.mq`) with the most samples.
+        Time spent in callees outside these modules, e.g. the checksum tables, is counted
+        as own time of the innermost function of these modules. Idle samples are not counted.
+        """
+        prefixes = tuple(f"{name}:" for name in modules)
+        samples = Counter()
+        own = Counter()
+        for stack, count in self.stacks.items():
+            relevant = [frame for frame in stack[1:] if frame.startswith(prefixes)]
+            if not relevant:
+                continue
+            for function in set(relevant):
+                samples[function] += count
+            own[relevant[-1]] += count
+
+        total = self.matched_samples or 1
+        return [
+            FunctionStats(function=function, samples=count, own_samples=own[function], share=count / total)
+            for function, count in samples.most_common(top)
+        ]
+
+    def format_summary(self, modules: Iterable[str] = SUMMARY_MODULES, top: int = 20) -> str:
+        lines = [
+            f"{self.matched_samples} of {self.samples} samples in {self.duration:.1f}s ran integration code",
+            f"{'total':>7} {'own':>7} {'share':>6}  function",
+        ]
+        for stats in self.summary(modules, top):
+            lines.append(f"{stats.samples:7d} {stats.own_samples:7d} {stats.share:6.1%}  {stats.function}")
+        lines.append(f"{self.idle_samples} more thread samples were idle, waiting in")
+        for wait, count in self.idle_summary(modules):
+            lines.append(f"{count:7d}  {wait}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread that is running code from `package_dir`."""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, package_dir: str = _PACKAGE_DIR):
+        self.interval = interval
+        self.package_dir = package_dir
+        self._stacks = Counter()
+        self._idle = Counter()
+        self._samples = 0
+        self._labels: dict[CodeType, str] = {}
+        self._ours: dict[CodeType, bool] = {}
+        self._call_targets: dict[CodeType, dict[int, str]] = {}
+        self._thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+        self._started_at = 0.0
+        self._stopped_at = 0.0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            raise RuntimeError("profiler already started")
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="HigoalProfiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> ProfileResult:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._stopped_at = time.monotonic()
+        return ProfileResult(
+            Counter(self._stacks), self._samples, self._stopped_at - self._started_at, idle=Counter(self._idle)
+        )
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_ident:
+                    self._sample(names.get(ident, str(ident)), frame)
+            self._samples += 1
+
+    def _sample(self, thread_name: str, frame) -> None:
+        wait = self._blocking_call(frame)
+        stack = []
+        ours = False
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _label(code, self.package_dir)
+                self._ours[code] = code.co_filename.startswith(self.package_dir)
+            ours = ours or self._ours[code]
+            stack.append(label)
+            frame = frame.f_back
+        if ours:
+            stack.append(thread_name)
+            stack.reverse()
+            if wait is None:
+                self._stacks[tuple(stack)] += 1
+            else:
+                stack.append(wait)
+                self._idle[tuple(stack)] += 1
+
+    def _blocking_call(self, frame) -> str | None:
+        """The name of the call in BLOCKING_CALLS the innermost frame is executing, if any."""
+        targets = self._call_targets.get(frame.f_code)
+        if targets is None:
+            targets = self._call_targets[frame.f_code] = _call_targets(frame.f_code)
+        target = targets.get(frame.f_lasti)
+        return target if target in BLOCKING_CALLS else None
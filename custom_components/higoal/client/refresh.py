@@ -0,0 +1,80 @@
+"""
+Status refresh for devices that went silent.
+
+Devices push a status frame whenever a button changes, so a device that stops
+sending may simply be idle, or its frames may have been lost in the cloud relay.
+Instead of polling everything, each device is only asked for its status once it
+has been silent for considerably longer than its usual frame cadence (learned as
+a moving average on the Device), and at most `budget` devices are asked per run.
+Devices that do not answer are asked again with exponential backoff.
+"""
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .device import Device
+
+DEFAULT_MIN_SILENCE = 600.0  # seconds, never ask sooner than this
+DEFAULT_MAX_SILENCE = 7200.0  # seconds, bound on the staleness of any device
+DEFAULT_CADENCE_FACTOR = 4.0  # silence threshold in multiples of the learned frame interval
+DEFAULT_BUDGET = 10  # status requests per run
+RESPONSE_WINDOW = 10.0  # seconds in which a frame counts as the answer to our request
+
+
+class RefreshScheduler:
+    """Picks the devices whose silence exceeds their adaptive threshold."""
+
+    def __init__(self,
+                 min_silence: float = DEFAULT_MIN_SILENCE,
+                 max_silence: float = DEFAULT_MAX_SILENCE,
+                 cadence_factor: float = DEFAULT_CADENCE_FACTOR,
+                 budget: int = DEFAULT_BUDGET):
+        self.min_silence = min_silence
+        self.max_silence = max_silence
+        self.cadence_factor = cadence_factor
+        self.budget = budget
+        self._started_at: float | None = None
+        self._requested_at: dict[tuple, float] = {}
+        self._misses: dict[tuple, int] = {}  # consecutive requests without an answer
+
+    def threshold(self, identifier: tuple, device: 'Device') -> float:
+        """Seconds of silence after which the device is asked for its status."""
+        if device.frame_interval is None:
+            threshold = self.max_silence
+        else:
+            threshold = min(max(device.frame_interval * self.cadence_factor, self.min_silence), self.max_silence)
+        return min(threshold * 2 ** self._misses.get(identifier, 0), self.max_silence)
+
+    def on_frame(self, identifier: tuple, device: 'Device', now: float) -> None:
+        """Record a status frame. Answers to our own requests do not count towards the cadence."""
+        requested_at = self._requested_at.pop(identifier, None)
+        self._misses.pop(identifier, None)
+        solicited = requested_at is not None and now - requested_at <= RESPONSE_WINDOW
+        device.record_frame(now, learn_cadence=not solicited)
+
+    def due(self, devices: Iterable[tuple[tuple, 'Device']], now: float) -> list['Device']:
+        """The most overdue devices, at most `budget`. They are considered requested at `now`."""
+        if self._started_at is None:
+            self._started_at = now
+
+        overdue = []
+        for identifier, device in devices:
+            last_heard = device.last_frame_at if device.last_frame_at is not None else self._started_at
+            last_seen = max(last_heard, self._requested_at.get(identifier, last_heard))
+            threshold = self.threshold(identifier, device)
+            silence = now - last_seen
+            if silence >= threshold:
+                overdue.append((silence / threshold, identifier, device))
+
+        overdue.sort(key=lambda item: item[0], reverse=True)
+        chosen = overdue[:self.budget]
+        for _, identifier, _ in chosen:
+            if identifier in self._requested_at:
+                self._misses[identifier] = self._misses.get(identifier, 0) + 1
+            self._requested_at[identifier] = now
+        return [device for _, _, device in chosen]
+
+    def forget(self, identifier: tuple) -> None:
+        self._requested_at.pop(identifier, None)
+        self._misses.pop(identifier, None)
@@ -0,0 +1,57 @@
+"""
+Copy-on-write registries shared between the broker thread and the event loop.
+
+Readers take the current snapshot (a read-only mapping) and can iterate it freely
+without locking. Writers are serialized, work on a private copy and publish it with
+a single reference swap, so a reader never observes a partially applied change.
+"""
+
+import threading
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from types import MappingProxyType
+
+
+class SnapshotRegistry[K, V]:
+    """A mapping with lock-free reads and atomically published writes."""
+
+    def __init__(self, initial: Mapping[K, V] | None = None):
+        self._lock = threading.Lock()
+        self._snapshot: Mapping[K, V] = MappingProxyType(dict(initial or {}))
+
+    @property
+    def snapshot(self) -> Mapping[K, V]:
+        """Return the current immutable view."""
+        return self._snapshot
+
+    @contextmanager
+    def edit(self) -> Iterator[dict[K, V]]:
+        """
+        Yield a private copy of the registry and publish it when the block exits.
+
+        If the block raises, the copy is discarded and the previous snapshot is kept.
+        """
+        with self._lock:
+            draft = dict(self._snapshot)
+            yield draft
+            self._snapshot = MappingProxyType(draft)
+
+    def set(self, key: K, value: V) -> None:
+        with self.edit() as draft:
+            draft[key] = value
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        if key not in self._snapshot:
+            return default
+        with self.edit() as draft:
+            return draft.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshot = MappingProxyType({})
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._snapshot
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
@@ -0,0 +1,118 @@
+"""
+Several broker connections that act as one.
+
+For accounts with many homes, the busiest homes get a MessageBroker connection
+of their own, authenticated for that home only (the auth frame carries a single
+home id) and with its own receive thread, so a slow frame handler only holds up
+the home of its own connection. When there are more homes than connections, the
+last connection is authenticated for every home and serves the remaining ones;
+frames it also receives for the other homes are repeats the Manager ignores.
+`ShardedBroker` offers the surface of a single MessageBroker to the Manager:
+outbound frames are routed to the connection of the device's home, and inbound
+frames of every connection go to the same handlers, which must therefore be
+thread-safe (Manager.on_receive locks only its per-device bookkeeping and looks
+unknown devices up on a worker thread, so one connection never waits on another).
+
+Unverified against the real backend: it may allow only one connection per user,
+and whether it honours the home id in the auth frame is not known.
+"""
+
+import logging
+import time
+from collections.abc import Callable, Iterable, Mapping
+
+from .mq import Message, MessageBroker, MessageHandler
+from .outbox import OutboundBuffer
+
+logger = logging.getLogger(__name__)
+
+
+def partition_homes(device_counts: Mapping[str, int], shards: int) -> list[str | None]:
+    """
+    The home of each of at most `shards` connections, busiest homes first.
+    None stands for a connection covering every home, used when there are more homes than connections.
+    """
+    homes = sorted(device_counts, key=lambda home_id: device_counts[home_id], reverse=True)
+    if len(homes) <= shards:
+        return homes
+    return [*homes[:shards - 1], None]
+
+
+class ShardedBroker:
+    """
+    Routes frames to one of several brokers; `route` maps a frame to the index of its broker.
+    Each broker should have an outbox of its own; `outbox` holds the frames buffered before the
+    brokers connected, and is routed once all of them did.
+    """
+
+    def __init__(self, shards: list[MessageBroker], route: Callable[[bytes], int], outbox: OutboundBuffer):
+        self.shards = shards
+        self.route = route
+        self.outbox = outbox
+
+    def _shard_for(self, data: bytes) -> MessageBroker:
+        index = self.route(data)
+        return self.shards[index if 0 <= index < len(self.shards) else 0]
+
+    @property
+    def connected(self) -> bool:
+        return any(shard.connected for shard in self.shards)
+
+    @property
+    def endpoint(self) -> str:
+        return ", ".join(shard.endpoint for shard in self.shards)
+
+    def _set_all(self, name: str, value) -> None:
+        for shard in self.shards:
+            setattr(shard, name, value)
+
+    # Tuning and handover flags apply to every connection
+    reconnect = property(lambda self: self.shards[0].reconnect, lambda self, value: self._set_all("reconnect", value))
+    retry_interval = property(lambda self: self.shards[0].retry_interval,
+                              lambda self, value: self._set_all("retry_interval", value))
+    batch_interval = property(lambda self: self.shards[0].batch_interval,
+                              lambda self, value: self._set_all("batch_interval", value))
+    buffer_size = property(lambda self: self.shards[0].buffer_size,
+                           lambda self, value: self._set_all("buffer_size", value))
+
+    def add_message_handler(self, handler: MessageHandler) -> None:
+        for shard in self.shards:
+            shard.add_message_handler(handler)
+
+    def connect(self, attempts: int | None = None) -> bool:
+        """Connect every broker. Returns False if stopped or out of `attempts` before all of them connected."""
+        for shard in self.shards:
+            if not shard.connect(attempts=attempts):
+                return False
+        self.flush_outbox()
+        return True
+
+    def wait_until_receiving(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        return all(shard.wait_until_receiving(max(0.0, deadline - time.monotonic())) for shard in self.shards)
+
+    def send_message(self, message: Message) -> bool:
+        return self._shard_for(message.data).send_message(message)
+
+    def send_messages(self, messages: Iterable[Message], interval: float | None = None) -> int:
+        """Send a batch, split by broker; each part is paced on its own connection."""
+        parts: dict[int, list[Message]] = {}
+        for message in messages:
+            parts.setdefault(id(self._shard_for(message.data)), []).append(message)
+        sent = 0
+        for shard in self.shards:
+            if id(shard) in parts:
+                sent += shard.send_messages(parts[id(shard)], interval)
+        return sent
+
+    def flush_outbox(self) -> int:
+        frames = self.outbox.drain()
+        if not frames:
+            return 0
+        return self.send_messages([Message(frame) for frame in frames])
+
+    def stop(self, timeout: float | None = None) -> bool:
+        stopped = True
+        for shard in self.shards:
+            stopped = shard.stop(timeout) and stopped
+        return stopped
@@ -0,0 +1,103 @@
+"""
+Local position estimation for shutters.
+
+A shutter is driven by a pair of buttons (see Entity.get_related_entity): one that
+opens and one that closes. Status frames only arrive now and then while a shutter
+moves, so the tracker learns how long a full travel takes in each direction from
+observed movements and interpolates the position in between frames.
+"""
+
+from dataclasses import dataclass
+
+DEFAULT_TRAVEL_TIME = 30.0  # seconds for a full open or close before anything was learned
+_MIN_LEARNING_DISTANCE = 0.1  # ignore movements shorter than 10% of the full travel
+_LEARNING_RATE = 0.3  # weight of a new observation in the moving average
+
+
+@dataclass
+class _Movement:
+    direction: int  # +1 opening, -1 closing
+    started_at: float
+    start_position: float  # 0.0 closed .. 1.0 open
+
+
+class ShutterTracker:
+    """Tracks the (estimated) position of a shutter as a fraction, 0.0 closed and 1.0 open."""
+
+    def __init__(self, open_travel_time: float = DEFAULT_TRAVEL_TIME,
+                 close_travel_time: float = DEFAULT_TRAVEL_TIME):
+        self.open_travel_time = open_travel_time
+        self.close_travel_time = close_travel_time
+        self._position: float | None = None
+        self._position_at: float | None = None
+        self._reported: float | None = None  # position of the last frame that carried one
+        self._movement: _Movement | None = None
+
+    @property
+    def is_moving(self) -> bool:
+        return self._movement is not None
+
+    def update(self, now: float, opening: bool, closing: bool, position: float | None) -> None:
+        """
+        Feed the state of a status frame.
+
+        `position` is the reported position (0.0 closed, 1.0 open) or None when unknown.
+        """
+        direction = 1 if opening else -1 if closing else 0
+        movement = self._movement
+
+        if position is not None:
+            # While the movement goes on, frames about the other buttons of the device repeat the
+            # position reported when it started; only a new position (or a stop) re-anchors the estimate.
+            moving_on = movement is not None and movement.direction == direction
+            if not moving_on or position != self._reported:
+                self._position = position
+                self._position_at = now
+            self._reported = position
+
+        if movement is not None and movement.direction != direction:
+            # The movement ended (or reversed): learn from the whole travel when the frame carried a position.
+            if position is not None:
+                self._learn(movement.direction, movement.start_position, movement.started_at, position, now)
+            else:
+                self._position = self.estimate(now)
+                self._position_at = now
+            self._movement = None
+
+        if direction and self._movement is None:
+            start = self.estimate(now)
+            if start is not None:
+                self._position = start
+                self._position_at = now
+                self._movement = _Movement(direction=direction, started_at=now, start_position=start)
+
+    def estimate(self, now: float) -> float | None:
+        """The position at `now`, extrapolated from the last known position while moving."""
+        if self._position is None:
+            return None
+        movement = self._movement
+        if movement is None or self._position_at is None:
+            return self._position
+
+        travel_time = self.open_travel_time if movement.direction > 0 else self.close_travel_time
+        elapsed = max(0.0, now - self._position_at)
+        position = self._position + movement.direction * elapsed / travel_time
+        return max(0.0, min(1.0, position))
+
+    def _learn(self, direction: int, start: float | None, started_at: float | None,
+               end: float, ended_at: float) -> None:
+        if start is None or started_at is None:
+            return
+        distance = (end - start) * direction
+        elapsed = ended_at - started_at
+        if distance < _MIN_LEARNING_DISTANCE or elapsed <= 0:
+            return
+        # Clamped positions (fully open/closed) underestimate the distance, so only learn from
+        # movements that stopped short of the end stop.
+        if end in (0.0, 1.0):
+            return
+        observed = elapsed / distance
+        if direction > 0:
+            self.open_travel_time += _LEARNING_RATE * (observed - self.open_travel_time)
+        else:
+            self.close_travel_time += _LEARNING_RATE * (observed - self.close_travel_time)
@@ -0,0 +1,74 @@
+"""
+Debug tracing of the raw frames exchanged with the broker.
+
+Frames are only traced when the `custom_components.higoal.client.trace` logger is
+enabled for DEBUG. The enabled check is the logger's own cached level lookup and
+is done before anything else, so with tracing off the frame path pays one method
+call per frame. When enabled, a device filter and 1-in-N sampling decide which
+frames are logged, and the hex dump is only built if a handler formats the record.
+
+Every record carries the frame as structured `extra` fields (`frame_direction`,
+`frame_device`, `frame`) for handlers that want more than the message text.
+"""
+
+import itertools
+import logging
+from collections.abc import Iterable
+
+logger = logging.getLogger(__name__)
+
+DIRECTION_IN = "rx"
+DIRECTION_OUT = "tx"
+
+type Identifier = tuple[int, int, int, int]
+
+
+class _Hex:
+    """Formats bytes as hex only when the log record is rendered."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __str__(self) -> str:
+        return self.data.hex()
+
+
+class FrameTracer:
+    """
+    Decides which frames are logged and logs them.
+
+    `sample_rate` logs one in every N frames that pass the device filter. `devices`
+    restricts tracing to the given device identifiers (None traces every device); frames
+    without an identifier (e.g. the auth frame) are only traced when no filter is set.
+    """
+
+    def __init__(self, sample_rate: int = 1, devices: Iterable[Identifier] | None = None,
+                 trace_logger: logging.Logger = logger):
+        self._logger = trace_logger
+        self._counter = itertools.count()
+        self.sample_rate = 1
+        self.devices: frozenset[Identifier] | None = None
+        self.configure(sample_rate, devices)
+
+    def configure(self, sample_rate: int = 1, devices: Iterable[Identifier] | None = None) -> None:
+        if sample_rate < 1:
+            raise ValueError("sample_rate must be at least 1")
+        self.sample_rate = sample_rate
+        self.devices = frozenset(devices) if devices is not None else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def trace(self, direction: str, data: bytes, device: Identifier | None = None) -> None:
+        """Log a frame if it passes the device filter and sampling. Callers check `enabled` first."""
+        if self.devices is not None and device not in self.devices:
+            return
+        if self.sample_rate > 1 and next(self._counter) % self.sample_rate:
+            return
+        self._logger.debug(
+            "%s %s device=%s", direction, _Hex(data), device,
+            extra={"frame_direction": direction, "frame_device": device, "frame": data},
+        )
@@ -0,0 +1,169 @@
+"""
+HTTP transport shared by the cloud API calls.
+
+Every request gets a connect and a read timeout, so a hung HTTPS connection
+fails instead of blocking an executor thread (and with it setup or the
+broker's `on_connect`) forever. Connection errors, timeouts and 5xx/429
+answers are retried with exponential backoff, but only while the shared
+`RetryBudget` has tokens: when the cloud is slow for everyone, retries dry up
+instead of multiplying the load and the number of busy threads. Latency and
+errors are reported per endpoint to `Metrics` as `http.<endpoint>`.
+
+The blocking `request` works on a `requests.Session`, `async_request` on an
+aiohttp `ClientSession`; both share the budget and the metrics.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 5.0  # seconds
+READ_TIMEOUT = 15.0  # seconds
+POOL_SIZE = 4  # keep-alive connections to the API host
+MAX_RETRIES = 2
+BACKOFF = 0.5  # seconds before the first retry, doubled for each further one
+RETRY_BUDGET_CAPACITY = 10  # retries that can be spent in a burst
+RETRY_BUDGET_RATE = 0.1  # retries regained per second
+
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RetryBudget:
+    """Token bucket limiting how many retries may be made."""
+
+    def __init__(self, capacity: float = RETRY_BUDGET_CAPACITY, rate: float = RETRY_BUDGET_RATE):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def try_acquire(self) -> bool:
+        """Take a token for one retry, False if the budget is spent."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+def _endpoint(url: str) -> str:
+    return urlsplit(url).path.strip("/") or "/"
+
+
+class HttpClient:
+    """Timeouts, retries within a budget and per-endpoint stats around an HTTP session."""
+
+    def __init__(self, session: Any = None,
+                 connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT,
+                 pool_size: int = POOL_SIZE,
+                 max_retries: int = MAX_RETRIES,
+                 backoff: float = BACKOFF,
+                 budget: RetryBudget | None = None,
+                 metrics: Metrics | None = None):
+        if session is None:
+            import requests  # only the blocking client needs it
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            # One host, so a single pool sized for the threads that may call it at once
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session = session
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.budget = budget if budget is not None else RetryBudget()
+        self.metrics = metrics if metrics is not None else Metrics()
+
+    def _retry_delay(self, attempt: int) -> float | None:
+        """Seconds to wait before retrying after `attempt` failed, or None to give up."""
+        if attempt >= self.max_retries:
+            return None
+        if not self.budget.try_acquire():
+            self.metrics.increment("http.retry_budget_exhausted")
+            return None
+        self.metrics.increment("http.retries")
+        # Full jitter keeps the retries of concurrent callers apart
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _record(self, endpoint: str, started: float, failed: bool) -> None:
+        self.metrics.observe(f"http.{endpoint}", time.monotonic() - started)
+        if failed:
+            self.metrics.increment(f"http.{endpoint}.errors")
+
+    def request(self, method: str, url: str, **kwargs):
+        """`session.request` with timeouts and retries. The last response or error is returned or raised."""
+        from requests import ConnectionError, Timeout
+
+        endpoint = _endpoint(url)
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                self._record(endpoint, started, failed=True)
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+                logger.debug("%s %s failed, retrying in %.2fs: %s", method, endpoint, delay, e)
+            else:
+                failed = response.status_code in _RETRY_STATUSES
+                self._record(endpoint, started, failed)
+                delay = self._retry_delay(attempt) if failed else None
+                if delay is None:
+                    return response
+                response.close()  # give the connection back to the pool before waiting
+                logger.debug("%s %s answered %s, retrying in %.2fs", method, endpoint, response.status_code, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    async def async_request(self, method: str, url: str, **kwargs):
+        """Like `request`, for an aiohttp session."""
+        import aiohttp
+
+        endpoint = _endpoint(url)
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(connect=self.connect_timeout, sock_read=self.read_timeout))
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._record(endpoint, started, failed=True)
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+                logger.debug("%s %s failed, retrying in %.2fs: %s", method, endpoint, delay, e)
+            else:
+                failed = response.status in _RETRY_STATUSES
+                self._record(endpoint, started, failed)
+                delay = self._retry_delay(attempt) if failed else None
+                if delay is None:
+                    return response
+                response.release()
+                logger.debug("%s %s answered %s, retrying in %.2fs", method, endpoint, response.status, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
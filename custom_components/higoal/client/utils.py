@@ -34,6 +34,22 @@ class ChecksumHandler:
             start_index += 1
         return checksum
 
+    @staticmethod
+    def lookup_table(secret_byte) -> list[int]:
+        """
+        Per-byte table equivalent to the inner loop of compute_checksum: checksum = table[checksum ^ byte].
+        """
+        unsigned_byte = ChecksumHandler.convert_to_unsigned(secret_byte)
+        table = []
+        for value in range(256):
+            for _ in range(8):
+                bit = value & 1
+                value >>= 1
+                if bit != 0:
+                    value ^= unsigned_byte
+            table.append(value)
+        return table
+
     @staticmethod
     def get_checksum(data, start_index, end_index):
         return [
@@ -134,15 +150,20 @@ def encode_token(token):
     return bytes(byte_arr)
 
 
-def generate_auth_command(token: str) -> bytes:
+def generate_auth_command(token: str, home_id: str | None = None) -> bytes:
     """
     This function builds a byte array which embeds the token of the user. It is used as the first command that is sent
-    when a socket session is established.
+    when a socket session is established. Without a home id the session covers every home of the user.
     """
     base_byte_array = [170, 90, 1, 1, 1, 2, 240, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0,
                        0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1]
     token_byte_array = encode_token(token)
     home_id_byte_array = [0, 0, 0, 0]  # This also gets the job done
+    if home_id is not None:
+        numeric_home_id = CharacterMapper.parse_custom_encoded_string(home_id)
+        if numeric_home_id > 0:
+            # Encoded like device ids, little-endian
+            home_id_byte_array = list(numeric_home_id.to_bytes(4, byteorder="little"))
     base_byte_array[9] = token_byte_array[2]
     base_byte_array[10] = token_byte_array[7]
     base_byte_array[11] = home_id_byte_array[1]
@@ -2,15 +2,51 @@
 
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
 import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import callback
+from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers import selector
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from slugify import slugify
 
-from .client.api import AsyncApi
-from .const import DOMAIN, logger
+from .const import (
+    CONF_API_PORT,
+    CONF_BATCH_INTERVAL,
+    CONF_BROKER_CONNECTIONS,
+    CONF_BROKER_PORT,
+    CONF_BUFFER_SIZE,
+    CONF_DAEMON_SOCKET,
+    CONF_HOST,
+    CONF_OFFLINE_AFTER_FRAMES,
+    CONF_OFFLINE_AFTER_SECONDS,
+    CONF_OFFLINE_PROBE_INTERVAL,
+    CONF_RETRY_INTERVAL,
+    CONF_TOKEN_MAX_AGE,
+    CONF_TRACE_DEVICES,
+    CONF_TRACE_SAMPLE_RATE,
+    DEFAULT_API_PORT,
+    DEFAULT_BATCH_INTERVAL,
+    DEFAULT_BROKER_CONNECTIONS,
+    DEFAULT_BROKER_PORT,
+    DEFAULT_BUFFER_SIZE,
+    DEFAULT_DAEMON_SOCKET,
+    DEFAULT_HOST,
+    DEFAULT_OFFLINE_AFTER_FRAMES,
+    DEFAULT_OFFLINE_AFTER_SECONDS,
+    DEFAULT_OFFLINE_PROBE_INTERVAL,
+    DEFAULT_RETRY_INTERVAL,
+    DEFAULT_TOKEN_MAX_AGE,
+    DEFAULT_TRACE_SAMPLE_RATE,
+    DOMAIN,
+    logger,
+)
+
+if TYPE_CHECKING:
+    from .client.api import AsyncApi
 
 
 class FlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
@@ -18,6 +54,14 @@ class FlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+            config_entry: config_entries.ConfigEntry,
+    ) -> OptionsFlowHandler:
+        """Get the options flow for this handler."""
+        return OptionsFlowHandler()
+
     async def async_step_user(
             self,
             user_input: dict | None = None,
@@ -69,5 +113,92 @@ class FlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def _test_credentials(self, http_client, username: str, password: str) -> None:
         """Validate credentials."""
+        AsyncApi = await self.hass.async_add_import_executor_job(_load_api)
         api = AsyncApi(username=username, password=password, session=http_client)
         await api.sign_in()
+
+
+def _load_api() -> type[AsyncApi]:
+    """Import the cloud API on first use only, see _load_client in __init__."""
+    from .client.api import AsyncApi
+
+    return AsyncApi
+
+
+def _number(minimum: float, maximum: float, step: float, unit: str) -> selector.NumberSelector:
+    return selector.NumberSelector(
+        selector.NumberSelectorConfig(
+            min=minimum,
+            max=maximum,
+            step=step,
+            unit_of_measurement=unit,
+            mode=selector.NumberSelectorMode.BOX,
+        )
+    )
+
+
+# (option, default, validator, selector)
+TUNING_OPTIONS = [
+    (CONF_HOST, DEFAULT_HOST, vol.All(str, vol.Length(min=1)),
+     selector.TextSelector()),
+    (CONF_API_PORT, DEFAULT_API_PORT, vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
+     _number(1, 65535, 1, "")),
+    (CONF_BROKER_PORT, DEFAULT_BROKER_PORT, vol.All(vol.Coerce(int), vol.Range(min=1, max=65535)),
+     _number(1, 65535, 1, "")),
+    (CONF_BROKER_CONNECTIONS, DEFAULT_BROKER_CONNECTIONS, vol.All(vol.Coerce(int), vol.Range(min=1, max=16)),
+     _number(1, 16, 1, "")),
+    (CONF_DAEMON_SOCKET, DEFAULT_DAEMON_SOCKET, vol.All(str, vol.Strip),
+     selector.TextSelector()),
+    (CONF_RETRY_INTERVAL, DEFAULT_RETRY_INTERVAL, vol.All(vol.Coerce(float), vol.Range(min=0.5, max=300)),
+     _number(0.5, 300, 0.5, "s")),
+    (CONF_BATCH_INTERVAL, DEFAULT_BATCH_INTERVAL, vol.All(vol.Coerce(float), vol.Range(min=0, max=1)),
+     _number(0, 1, 0.005, "s")),
+    (CONF_BUFFER_SIZE, DEFAULT_BUFFER_SIZE, vol.All(vol.Coerce(int), vol.Range(min=48, max=65536)),
+     _number(48, 65536, 1, "B")),
+    (CONF_TOKEN_MAX_AGE, DEFAULT_TOKEN_MAX_AGE, vol.All(vol.Coerce(int), vol.Range(min=5, max=1440)),
+     _number(5, 1440, 1, "min")),
+    (CONF_OFFLINE_PROBE_INTERVAL, DEFAULT_OFFLINE_PROBE_INTERVAL, vol.All(vol.Coerce(float), vol.Range(min=0, max=3600)),
+     _number(0, 3600, 1, "s")),
+    (CONF_OFFLINE_AFTER_FRAMES, DEFAULT_OFFLINE_AFTER_FRAMES, vol.All(vol.Coerce(int), vol.Range(min=1, max=100)),
+     _number(1, 100, 1, "")),
+    (CONF_OFFLINE_AFTER_SECONDS, DEFAULT_OFFLINE_AFTER_SECONDS, vol.All(vol.Coerce(float), vol.Range(min=0, max=3600)),
+     _number(0, 3600, 1, "s")),
+    (CONF_TRACE_SAMPLE_RATE, DEFAULT_TRACE_SAMPLE_RATE, vol.All(vol.Coerce(int), vol.Range(min=1, max=100000)),
+     _number(1, 100000, 1, "")),
+    (CONF_TRACE_DEVICES, [], vol.All(cv.ensure_list, [str]),
+     selector.DeviceSelector(selector.DeviceSelectorConfig(integration=DOMAIN, multiple=True))),
+]
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Tuning options for the connection to the Higoal cloud."""
+
+    async def async_step_init(
+            self,
+            user_input: dict | None = None,
+    ) -> config_entries.ConfigFlowResult:
+        """Manage the options."""
+        _errors = {}
+        if user_input is not None:
+            try:
+                options = {
+                    key: validator(user_input.get(key, default))
+                    for key, default, validator, _ in TUNING_OPTIONS
+                }
+            except vol.Invalid as e:
+                logger.warning(e)
+                _errors["base"] = "invalid_option"
+            else:
+                return self.async_create_entry(data=options)
+
+        current = {**self.config_entry.options, **(user_input or {})}
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(
+                {
+                    vol.Optional(key, default=current.get(key, default)): field_selector
+                    for key, default, _, field_selector in TUNING_OPTIONS
+                },
+            ),
+            errors=_errors,
+        )
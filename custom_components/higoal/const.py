@@ -1,8 +1,46 @@
 """Constants for higoal."""
 
+from datetime import timedelta
 from logging import Logger, getLogger
 
 logger: Logger = getLogger(__package__)
 DOMAIN = "higoal"
 HIGOAL_HA_SIGNAL_UPDATE_ENTITY = "higoal_entry_update"
-HIGOAL_DISCOVERY_NEW = 'higoal_discovery_new'
\ No newline at end of file
+HIGOAL_DISCOVERY_NEW = 'higoal_discovery_new'
+UNLOAD_TIMEOUT = 5.0  # seconds to wait for the connection to shut down
+DEVICE_SYNC_INTERVAL = timedelta(minutes=30)  # how often the device list is reconciled with the cloud
+STALE_REFRESH_INTERVAL = timedelta(minutes=1)  # how often silent devices are looked for, see client.refresh
+
+# The ACTION_* names of client.device, repeated so the services load without the client
+ACTION_TURN_ON = "turn_on"
+ACTION_TURN_OFF = "turn_off"
+
+# Options
+CONF_HOST = "host"
+CONF_API_PORT = "api_port"
+CONF_BROKER_PORT = "broker_port"
+CONF_RETRY_INTERVAL = "retry_interval"
+CONF_BATCH_INTERVAL = "batch_interval"
+CONF_BUFFER_SIZE = "buffer_size"
+CONF_TOKEN_MAX_AGE = "token_max_age"
+CONF_OFFLINE_PROBE_INTERVAL = "offline_probe_interval"
+CONF_OFFLINE_AFTER_FRAMES = "offline_after_frames"
+CONF_OFFLINE_AFTER_SECONDS = "offline_after_seconds"
+CONF_TRACE_SAMPLE_RATE = "trace_sample_rate"
+CONF_TRACE_DEVICES = "trace_devices"
+CONF_DAEMON_SOCKET = "daemon_socket"
+CONF_BROKER_CONNECTIONS = "broker_connections"
+
+DEFAULT_HOST = "server.higoal.net"
+DEFAULT_API_PORT = 8143
+DEFAULT_BROKER_PORT = 17670
+DEFAULT_RETRY_INTERVAL = 5.0  # seconds
+DEFAULT_BATCH_INTERVAL = 0.02  # seconds
+DEFAULT_BUFFER_SIZE = 8192  # bytes
+DEFAULT_TOKEN_MAX_AGE = 60  # minutes
+DEFAULT_OFFLINE_PROBE_INTERVAL = 0.0  # seconds, 0 probes on every received frame
+DEFAULT_OFFLINE_AFTER_FRAMES = 3  # consecutive offline frames before a device is shown unavailable
+DEFAULT_OFFLINE_AFTER_SECONDS = 60.0  # or seconds of reporting offline, whichever comes first
+DEFAULT_TRACE_SAMPLE_RATE = 1  # trace one in N frames
+DEFAULT_DAEMON_SOCKET = ""  # empty runs the client in-process, see client.daemon
+DEFAULT_BROKER_CONNECTIONS = 1  # socket connections the homes of the account are split over
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import time
+from datetime import timedelta
 from typing import Any
 
 from homeassistant.components.cover import (
@@ -10,11 +12,18 @@ from homeassistant.components.cover import (
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
+from homeassistant.helpers.event import async_track_time_interval
 
 from .client import device
+from .client.manager import UnknownDevice
+from .client.shutter import ShutterTracker
 from .const import HIGOAL_DISCOVERY_NEW
 from .data import HigoalConfigEntry
 from .entity import BaseHigoalEntity
+from .store import TravelTimeStore
+
+# How often the interpolated position is pushed while a shutter moves.
+POSITION_UPDATE_INTERVAL = timedelta(seconds=1)
 
 
 async def async_setup_entry(
@@ -28,15 +37,18 @@ async def async_setup_entry(
     def async_discover_device(device_ids: list[str]) -> None:
         """Discover and add a discovered sensor."""
         entities: list[HigoalCover] = []
+        device_map = hass_data.manager.device_map
         for device_id in device_ids:
-            higoal_device = hass_data.manager.device_map[device_id]
+            higoal_device = device_map.get(device_id)
+            if higoal_device is None or higoal_device is UnknownDevice:
+                continue
             for entity in higoal_device.entities:
                 if entity.type != device.TYPE_SHUTTER:
                     continue
                 if entity.name == "":
                     continue
 
-                entities.append(HigoalCover(entity, entity.get_related_entity()))
+                entities.append(HigoalCover(entity, entity.get_related_entity(), hass_data.travel_times))
 
         async_add_entities(entities)
 
@@ -50,10 +62,13 @@ async def async_setup_entry(
 class HigoalCover(BaseHigoalEntity, CoverEntity):
     """Representation of a smart blind."""
 
-    def __init__(self, open_button: device.Entity, close_button: device.Entity):
+    def __init__(self, open_button: device.Entity, close_button: device.Entity, travel_times: TravelTimeStore):
         super().__init__(open_button)
         self._open_button = open_button
         self._close_button = close_button
+        self._travel_times = travel_times
+        self._tracker = ShutterTracker(*(travel_times.get(self._attr_unique_id) or ()))
+        self._cancel_position_updates = None
 
     @property
     def supported_features(self) -> CoverEntityFeature:
@@ -68,8 +83,10 @@ class HigoalCover(BaseHigoalEntity, CoverEntity):
     @property
     def current_cover_position(self):
         """Return the position of the cover (0 = closed, 100 = open)."""
-        current_percentage = self._open_button.percentage()
-        return self._calculate_position(current_percentage)
+        position = self._tracker.estimate(time.monotonic())
+        if position is None:
+            return None
+        return round(position * 100)
 
     @property
     def is_closed(self) -> bool | None:
@@ -83,20 +100,61 @@ class HigoalCover(BaseHigoalEntity, CoverEntity):
     def is_opening(self) -> bool | None:
         return self._open_button.is_turned_on()
 
-    def open_cover(self, **kwargs: Any) -> None:
-        self._open_button.turn_on()
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._update_tracker()
+        self.async_on_remove(self._stop_position_updates)
+
+    async def _handle_state_update(
+            self, updated_status_properties: list[str] | None
+    ) -> None:
+        self._update_tracker()
+        await super()._handle_state_update(updated_status_properties)
+
+    def _update_tracker(self) -> None:
+        close_button = self._close_button
+        tracker = self._tracker
+        learned = (tracker.open_travel_time, tracker.close_travel_time)
+        tracker.update(
+            time.monotonic(),
+            opening=self._open_button.is_turned_on(),
+            closing=close_button is not None and close_button.is_turned_on(),
+            position=self._calculate_position(self._open_button.percentage()),
+        )
+        if (tracker.open_travel_time, tracker.close_travel_time) != learned:
+            self._travel_times.async_set(self._attr_unique_id, tracker.open_travel_time, tracker.close_travel_time)
+        if self._tracker.is_moving and self._cancel_position_updates is None:
+            self._cancel_position_updates = async_track_time_interval(
+                self.hass, self._async_push_position, POSITION_UPDATE_INTERVAL
+            )
+        elif not self._tracker.is_moving:
+            self._stop_position_updates()
+
+    @callback
+    def _async_push_position(self, now) -> None:
+        self.async_write_ha_state()
+
+    @callback
+    def _stop_position_updates(self) -> None:
+        if self._cancel_position_updates is not None:
+            self._cancel_position_updates()
+            self._cancel_position_updates = None
+
+    async def async_open_cover(self, **kwargs: Any) -> None:
+        self._queue(self._open_button.turn_on_command())
 
-    def close_cover(self, **kwargs: Any) -> None:
-        self._close_button.turn_on()
+    async def async_close_cover(self, **kwargs: Any) -> None:
+        self._queue(self._close_button.turn_on_command())
 
-    def stop_cover(self, **kwargs: Any) -> None:
+    async def async_stop_cover(self, **kwargs: Any) -> None:
         if self.is_closing:
-            self._close_button.turn_off()
+            self._queue(self._close_button.turn_off_command())
         elif self.is_opening:
-            self._open_button.turn_off()
+            self._queue(self._open_button.turn_off_command())
 
     @staticmethod
-    def _calculate_position(percentage: float | None) -> int | None:
+    def _calculate_position(percentage: float | None) -> float | None:
+        """Convert the reported percentage (1.0 = closed) into a position (1.0 = open)."""
         if percentage is None:
             return None
-        return 100 - int(percentage * 100)
+        return 1.0 - percentage
@@ -5,11 +5,13 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import TYPE_CHECKING
 
-from .client.manager import Manager, EntityListener
-
 if TYPE_CHECKING:
     from homeassistant.config_entries import ConfigEntry
 
+    from .client.manager import EntityListener, Manager
+
+    from .store import StatusStore, TravelTimeStore
+
 type HigoalConfigEntry = ConfigEntry[IntegrationData]
 
 
@@ -19,3 +21,6 @@ class IntegrationData:
 
     manager: Manager
     listener: EntityListener
+    status_store: StatusStore
+    travel_times: TravelTimeStore
+    connection_config: dict  # settings the manager was built with, see _connection_config
@@ -0,0 +1,31 @@
+"""Diagnostics support for higoal."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+
+if TYPE_CHECKING:
+    from homeassistant.core import HomeAssistant
+
+    from .data import HigoalConfigEntry
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant,
+    entry: HigoalConfigEntry,
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    manager = entry.runtime_data.manager
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "connection": async_redact_data(entry.runtime_data.connection_config, TO_REDACT),
+        "connected": manager.mq is not None and manager.mq.connected,
+        "devices": len(manager.device_map),
+        "offline_devices": len(manager.offline_devices),
+        "metrics": manager.metrics.snapshot(),
+    }
@@ -34,8 +34,19 @@ class BaseHigoalEntity(HomeAssistantEntity):
                 self._handle_state_update,
             )
         )
+        if self.entity.state is None:
+            # Properties never fetch; ask for the missing status in the background.
+            self.hass.async_add_executor_job(
+                self.entity.device.manager.request_status, self.entity.device
+            )
+
+    def _queue(self, *frames: bytes | None) -> None:
+        """Send pre-encoded frames without blocking the event loop, see Manager.queue_frames."""
+        self.entity.device.manager.queue_frames(frame for frame in frames if frame)
 
     async def _handle_state_update(
             self, updated_status_properties: list[str] | None
     ) -> None:
+        # Buttons can be renamed in the app, see Device.update_from
+        self._attr_name = self.entity.name or "Higoal Entity"
         self.async_write_ha_state()
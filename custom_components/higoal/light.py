@@ -10,6 +10,7 @@ from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
 
 from .client import device
+from .client.manager import UnknownDevice
 from .const import HIGOAL_DISCOVERY_NEW
 from .data import HigoalConfigEntry
 from .entity import BaseHigoalEntity
@@ -26,8 +27,11 @@ async def async_setup_entry(
     def async_discover_device(device_ids: list[str]) -> None:
         """Discover and add a discovered sensor."""
         entities: list[HigoalLight] = []
+        device_map = hass_data.manager.device_map
         for device_id in device_ids:
-            higoal_device = hass_data.manager.device_map[device_id]
+            higoal_device = device_map.get(device_id)
+            if higoal_device is None or higoal_device is UnknownDevice:
+                continue
             for entity in higoal_device.entities:
                 if entity.type != device.TYPE_DIMMER:
                     continue
@@ -53,7 +57,10 @@ class HigoalLight(BaseHigoalEntity, LightEntity):
     @property
     def brightness(self) -> int | None:
         """Return the current brightness (0..255)."""
-        return int(self.entity.percentage() * 255)
+        percentage = self.entity.percentage()
+        if percentage is None:
+            return None
+        return int(percentage * 255)
 
     @property
     def supported_color_modes(self) -> set[str]:
@@ -63,12 +70,11 @@ class HigoalLight(BaseHigoalEntity, LightEntity):
     def color_mode(self) -> str:
         return ColorMode.BRIGHTNESS
 
-    def turn_on(self, **kwargs: Any) -> None:
+    async def async_turn_on(self, **kwargs: Any) -> None:
         if ATTR_BRIGHTNESS in kwargs:
-            value = kwargs[ATTR_BRIGHTNESS]
-            self.entity.set_percentage(int(value / 255))
+            self._queue(self.entity.set_percentage_command(kwargs[ATTR_BRIGHTNESS] / 255))
         else:
-            self.entity.turn_on()
+            self._queue(self.entity.turn_on_command())
 
-    def turn_off(self, **kwargs: Any) -> None:
-        self.entity.turn_off()
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        self._queue(self.entity.turn_off_command())
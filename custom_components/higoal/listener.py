@@ -0,0 +1,117 @@
+"""Bridges client events into Home Assistant for higoal."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING
+
+from homeassistant.const import Platform
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_platform
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_send, dispatcher_send
+
+from .client.device import TYPE_DIMMER, TYPE_SHUTTER, TYPE_SWITCH
+from .client.manager import EntityListener
+from .const import DOMAIN, HIGOAL_DISCOVERY_NEW, HIGOAL_HA_SIGNAL_UPDATE_ENTITY
+
+if TYPE_CHECKING:
+    from .client.device import Device, Entity
+    from .store import StatusStore
+
+
+class HomeAssistantEntityListener(EntityListener):
+
+    def __init__(self, hass: HomeAssistant, status_store: StatusStore):
+        self.hass = hass
+        self.status_store = status_store
+
+    def on_entity_changed(self, entity: Entity):
+        self.on_entities_changed(entity.device, [entity])
+
+    def on_entities_changed(self, device: Device, entities: list[Entity]):
+        # The signal is per device, so one dispatch and one save per frame cover every changed button
+        dispatcher_send(
+            self.hass,
+            f"{HIGOAL_HA_SIGNAL_UPDATE_ENTITY}_{device.id}",
+            [],
+        )
+        self.hass.loop.call_soon_threadsafe(
+            self.status_store.async_schedule_save, device.manager
+        )
+
+    def on_device_added(self, device: Device):
+        self.hass.add_job(self.async_remove_device, device.id)
+
+        dispatcher_send(self.hass, HIGOAL_DISCOVERY_NEW, [device.identifier])
+
+    def on_device_removed(self, device: Device) -> None:
+        """Add device removed listener."""
+        self.hass.add_job(self.async_remove_device, device.id)
+
+    def on_device_updated(self, device: Device, layout_changed: bool) -> None:
+        self.hass.add_job(self.async_update_device, device, layout_changed)
+
+    async def async_update_device(self, device: Device, layout_changed: bool) -> None:
+        """Apply a changed device record: registry metadata, and the entities when the buttons changed."""
+        device_registry = dr.async_get(self.hass)
+        device_entry = device_registry.async_get_device(identifiers={(DOMAIN, device.id)})
+        if device_entry is not None:
+            device_registry.async_update_device(
+                device_entry.id,
+                name=device.name,
+                model=device.model_name,
+                sw_version=device.version,
+            )
+
+        if not layout_changed:
+            # Same entities, possibly renamed
+            async_dispatcher_send(self.hass, f"{HIGOAL_HA_SIGNAL_UPDATE_ENTITY}_{device.id}", [])
+            return
+
+        # The entities hold the replaced buttons: take them down and let the platforms
+        # add the new ones. Registry entries are kept so customisations survive, except
+        # for buttons that are gone or now belong to another platform.
+        stale = [
+            entity
+            for platform in entity_platform.async_get_platforms(self.hass, DOMAIN)
+            for entity in list(platform.entities.values())
+            if getattr(entity, "entity", None) is not None and entity.entity.device.id == device.id
+        ]
+        await asyncio.gather(*(entity.async_remove() for entity in stale))
+
+        if device_entry is not None:
+            expected = _expected_entities(device)
+            entity_registry = er.async_get(self.hass)
+            for registry_entry in er.async_entries_for_device(
+                    entity_registry, device_entry.id, include_disabled_entities=True
+            ):
+                if (registry_entry.domain, registry_entry.unique_id) not in expected:
+                    entity_registry.async_remove(registry_entry.entity_id)
+
+        async_dispatcher_send(self.hass, HIGOAL_DISCOVERY_NEW, [device.identifier])
+
+    @callback
+    def async_remove_device(self, device_id: str) -> None:
+        """Remove device from Home Assistant."""
+        device_registry = dr.async_get(self.hass)
+        device_entry = device_registry.async_get_device(
+            identifiers={(DOMAIN, device_id)}
+        )
+        if device_entry is not None:
+            device_registry.async_remove_device(device_entry.id)
+
+
+def _expected_entities(device: Device) -> set[tuple[str, str]]:
+    """(platform, unique id) of the entities the platforms create for a device."""
+    expected = set()
+    for entity in device.entities:
+        unique_id = f"{DOMAIN}:{device.id}:{entity.id}"
+        if entity.type == TYPE_SWITCH:
+            expected.add((Platform.SWITCH, unique_id))
+        elif entity.type == TYPE_DIMMER:
+            expected.add((Platform.LIGHT, unique_id))
+        elif entity.type == TYPE_SHUTTER and entity.name != "":
+            expected.add((Platform.COVER, unique_id))
+    return expected
@@ -0,0 +1,159 @@
+"""Services for higoal."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+import voluptuous as vol
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.service import async_extract_entity_ids
+
+from .client.profiler import SamplingProfiler  # standard library only, cheap to import
+from .const import ACTION_TURN_OFF, ACTION_TURN_ON, DOMAIN, logger
+
+if TYPE_CHECKING:
+    from .client.device import Entity
+    from .client.manager import Manager
+
+SERVICE_BULK_COMMAND = "bulk_command"
+SERVICE_PROFILE = "profile"
+ATTR_ACTION = "action"
+ATTR_DURATION = "duration"
+ATTR_INTERVAL = "interval"
+ATTR_TOP = "top"
+
+DATA_PROFILING = f"{DOMAIN}_profiling"
+
+BULK_COMMAND_SCHEMA = vol.Schema(
+    {
+        **cv.TARGET_SERVICE_FIELDS,
+        vol.Required(ATTR_ACTION): vol.In([ACTION_TURN_ON, ACTION_TURN_OFF]),
+    }
+)
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=30): vol.All(vol.Coerce(float), vol.Range(min=1, max=600)),
+        vol.Optional(ATTR_INTERVAL, default=10): vol.All(vol.Coerce(float), vol.Range(min=1, max=1000)),
+        vol.Optional(ATTR_TOP, default=20): vol.All(vol.Coerce(int), vol.Range(min=1, max=200)),
+    }
+)
+
+
+def _parse_unique_id(unique_id: str) -> tuple[str, int] | None:
+    """Split `higoal:<device id>:<button index>` into its parts."""
+    prefix, _, rest = unique_id.partition(":")
+    device_id, _, entity_id = rest.rpartition(":")
+    if prefix != DOMAIN or not device_id or not entity_id.isdigit():
+        return None
+    return device_id, int(entity_id)
+
+
+async def _async_bulk_command(hass: HomeAssistant, call: ServiceCall) -> None:
+    """Group the targeted entities per config entry and send each group as one batch."""
+    entity_registry = er.async_get(hass)
+    action = call.data[ATTR_ACTION]
+
+    batches: dict[str, list[tuple[Entity, str]]] = defaultdict(list)
+    managers: dict[str, Manager] = {}
+    for entity_id in await async_extract_entity_ids(hass, call):
+        registry_entry = entity_registry.async_get(entity_id)
+        if registry_entry is None or registry_entry.platform != DOMAIN:
+            continue
+        parsed = _parse_unique_id(registry_entry.unique_id)
+        config_entry = hass.config_entries.async_get_entry(registry_entry.config_entry_id)
+        if parsed is None or config_entry is None or not hasattr(config_entry, "runtime_data"):
+            continue
+
+        manager = config_entry.runtime_data.manager
+        entity = manager.find_entity(*parsed)
+        if entity is None:
+            logger.warning("Unknown higoal entity %s", entity_id)
+            continue
+        managers[config_entry.entry_id] = manager
+        batches[config_entry.entry_id].append((entity, action))
+
+    for entry_id, actions in batches.items():
+        manager = managers[entry_id]
+        manager.queue_frames(manager.build_bulk_commands(actions))
+
+
+async def _async_profile(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Sample the integration's threads for a while and save a collapsed-stack file and a summary."""
+    if hass.data.get(DATA_PROFILING):
+        raise HomeAssistantError("A higoal profile is already running")
+    hass.data[DATA_PROFILING] = True
+    try:
+        profiler = SamplingProfiler(interval=call.data[ATTR_INTERVAL] / 1000)
+        profiler.start()
+        try:
+            await asyncio.sleep(call.data[ATTR_DURATION])
+        finally:
+            result = await hass.async_add_executor_job(profiler.stop)
+    finally:
+        hass.data.pop(DATA_PROFILING, None)
+
+    top = call.data[ATTR_TOP]
+    start_time = int(time.time() * 1000000)
+    collapsed_path = hass.config.path(f"{DOMAIN}.profile.{start_time}.collapsed")
+    summary_path = hass.config.path(f"{DOMAIN}.profile.{start_time}.txt")
+
+    def write_files() -> None:
+        result.write_collapsed(collapsed_path)
+        with open(summary_path, "w", encoding="utf-8") as file:
+            file.write(result.format_summary(top=top))
+
+    await hass.async_add_executor_job(write_files)
+    logger.info("Profile written to %s and %s", collapsed_path, summary_path)
+
+    return {
+        "collapsed_file": collapsed_path,
+        "summary_file": summary_path,
+        "samples": result.samples,
+        "matched_samples": result.matched_samples,
+        "idle_samples": result.idle_samples,
+        "top": [
+            {
+                "function": stats.function,
+                "samples": stats.samples,
+                "own_samples": stats.own_samples,
+                "share": round(stats.share, 4),
+            }
+            for stats in result.summary(top=top)
+        ],
+    }
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the higoal services."""
+
+    async def async_bulk_command(call: ServiceCall) -> None:
+        await _async_bulk_command(hass, call)
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_BULK_COMMAND, async_bulk_command, schema=BULK_COMMAND_SCHEMA
+    )
+
+    async def async_profile(call: ServiceCall) -> ServiceResponse:
+        return await _async_profile(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PROFILE,
+        async_profile,
+        schema=PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
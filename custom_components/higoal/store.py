@@ -0,0 +1,73 @@
+"""Persistence of the last known device status for higoal."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, logger
+
+if TYPE_CHECKING:
+    from .client.manager import Manager
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 30  # seconds
+
+
+class StatusStore:
+    """Keeps the last status frame of every device across restarts."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._store: Store[dict[str, str]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.status"
+        )
+
+    async def async_restore(self, manager: Manager) -> None:
+        """Load the persisted statuses into the manager's devices."""
+        snapshot = await self._store.async_load()
+        if not snapshot:
+            return
+        restored = manager.restore_status_snapshot(snapshot)
+        logger.debug("Restored the last known status of %d devices", restored)
+
+    @callback
+    def async_schedule_save(self, manager: Manager) -> None:
+        """Persist the statuses once things settle down."""
+        self._store.async_delay_save(manager.status_snapshot, SAVE_DELAY)
+
+    async def async_save(self, manager: Manager) -> None:
+        await self._store.async_save(manager.status_snapshot())
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
+
+
+class TravelTimeStore:
+    """Keeps the learned travel times of the shutters (see client.shutter) across reloads, per cover."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._store: Store[dict[str, list[float]]] = Store(
+            hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.travel_times"
+        )
+        self._travel_times: dict[str, list[float]] = {}
+
+    async def async_load(self) -> None:
+        self._travel_times = await self._store.async_load() or {}
+
+    def get(self, unique_id: str) -> tuple[float, float] | None:
+        """The (open, close) travel times learned for a cover, None if nothing was learned yet."""
+        travel_times = self._travel_times.get(unique_id)
+        return tuple(travel_times) if travel_times else None
+
+    @callback
+    def async_set(self, unique_id: str, open_travel_time: float, close_travel_time: float) -> None:
+        self._travel_times[unique_id] = [open_travel_time, close_travel_time]
+        self._store.async_delay_save(lambda: self._travel_times, SAVE_DELAY)
+
+    async def async_save(self) -> None:
+        await self._store.async_save(self._travel_times)
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
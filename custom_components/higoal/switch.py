@@ -10,6 +10,7 @@ from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
 
 from .client import device
+from .client.manager import UnknownDevice
 from .const import HIGOAL_DISCOVERY_NEW
 from .data import HigoalConfigEntry
 from .entity import BaseHigoalEntity
@@ -26,8 +27,11 @@ async def async_setup_entry(
     def async_discover_device(device_ids: list[str]) -> None:
         """Discover and add a discovered sensor."""
         entities: list[HigoalSwitch] = []
+        device_map = hass_data.manager.device_map
         for device_id in device_ids:
-            higoal_device = hass_data.manager.device_map[device_id]
+            higoal_device = device_map.get(device_id)
+            if higoal_device is None or higoal_device is UnknownDevice:
+                continue
             for entity in higoal_device.entities:
                 if entity.type != device.TYPE_SWITCH:
                     continue
@@ -50,8 +54,8 @@ class HigoalSwitch(BaseHigoalEntity, SwitchEntity):
         """Return true if the switch is on."""
         return self.entity.is_turned_on()
 
-    def turn_on(self, **kwargs: Any) -> None:
-        self.entity.turn_on()
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        self._queue(self.entity.turn_on_command())
 
-    def turn_off(self, **kwargs: Any) -> None:
-        self.entity.turn_off()
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        self._queue(self.entity.turn_off_command())
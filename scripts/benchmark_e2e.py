@@ -0,0 +1,280 @@
+"""
+Measure the latency from a status frame arriving to Home Assistant's state machine showing it.
+
+The integration is set up in the Home Assistant test harness with a synthetic
+fleet of four-button devices (switches and dimmers); the cloud API and the
+broker socket are replaced by fakes. Status frames are then injected into
+`Manager.on_receive` from a worker thread, as the broker's receive thread
+would, in rounds of one frame per device. Every frame toggles all buttons of its
+device, so the frame has arrived in `hass.states` once each of the device's
+entities fired a state change. This covers the client (decoding, diffing, the
+listener) and the Home Assistant glue (`HomeAssistantEntityListener`,
+`dispatcher_send`, `BaseHigoalEntity._handle_state_update`,
+`async_write_ha_state`). Shutters are left out: their state follows the
+movement tracker rather than the frame alone.
+
+Reported per fleet size:
+
+* frames/s sustained from injection to the last state change of a round
+* end-to-end latency percentiles, from calling on_receive to the device's last state change
+* the client part: time spent in on_receive (which returns once the listener has signalled)
+* the Home Assistant part: end-to-end minus client
+
+If the client part stays flat while end-to-end grows, the time is spent in the
+event loop, not in the client; compare with scripts/loadtest.py, which measures
+the client alone.
+
+Needs `pytest-homeassistant-custom-component`.
+
+Usage: python scripts/benchmark_e2e.py [--entities 10 100 500 2000] [--rounds 5] [--rate 0]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+BUTTONS = 4  # buttons of the synthetic "4B" devices
+DEVICE_TYPE = 5  # a "4B" model, see client.utils.models
+ROUND_TIMEOUT = 60.0  # seconds a round may take before the benchmark gives up
+
+
+def device_payloads(count: int) -> list[dict]:
+    """Raw device records as returned by the cloud: alternating switch and dimmer buttons."""
+    return [
+        {
+            "id": str(10_000_000 + index),  # numeric ids are valid in the custom encoding
+            "type": DEVICE_TYPE,
+            "name": f"Bench {index}",
+            "roomId": f"room-{index // 8}",
+            "homeId": "home-0",
+            "ssid": "bench",
+            "mac": f"{index:012x}",
+            "version": "1.0",
+            "buttonName": ";".join(f"button {button}" for button in range(BUTTONS)) + ";",
+            "buttonType": ",".join("1" if button % 2 == 0 else "2" for button in range(BUTTONS)),
+        }
+        for index in range(count)
+    ]
+
+
+def status_frame(identifier: tuple, on: bool) -> bytes:
+    from custom_components.higoal.client.device import (
+        _FALLBACK_PERCENTAGE_OFFSET,
+        _OFF_VALUE,
+        _ON_VALUE,
+        _PERCENTAGE_FLAG_OFFSET,
+        _PERCENTAGE_OFFSET,
+        _STATUS_OFFSET,
+    )
+    from custom_components.higoal.client.mq import MESSAGE_SIZE, STATUS_HEADER, STATUS_IDENTIFIER
+
+    data = bytearray(MESSAGE_SIZE)
+    data[0], data[1] = STATUS_HEADER
+    data[STATUS_IDENTIFIER] = bytes(identifier)
+    for button in range(BUTTONS):
+        base = _STATUS_OFFSET + button
+        data[base] = _ON_VALUE if on else _OFF_VALUE
+        data[base + _PERCENTAGE_FLAG_OFFSET] = 1
+        data[base + _PERCENTAGE_OFFSET] = 50
+        data[base + _FALLBACK_PERCENTAGE_OFFSET] = 50
+    return bytes(data)
+
+
+class FakeBroker:
+    """Stands in for MessageBroker; the benchmark calls Manager.on_receive itself."""
+
+    connected = True
+    endpoint = "benchmark"
+
+    def send_message(self, message) -> bool:
+        return True
+
+    def send_messages(self, messages, interval=None) -> int:
+        return len(messages)
+
+    def stop(self, timeout=None) -> bool:
+        self.connected = False
+        return True
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+@dataclass
+class Result:
+    entities: int
+    devices: int
+    frames: int
+    elapsed: float
+    end_to_end: list[float] = field(repr=False)
+    client: list[float] = field(repr=False)
+
+    @property
+    def rate(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def home_assistant(self) -> list[float]:
+        return [total - client for total, client in zip(self.end_to_end, self.client, strict=True)]
+
+
+class Round:
+    """One frame per device; done once every entity of every device changed state."""
+
+    def __init__(self, hass, devices: dict[tuple, set[str]]):
+        self.pending = {identifier: set(entity_ids) for identifier, entity_ids in devices.items()}
+        self.sent_at: dict[tuple, float] = {}
+        self.client: dict[tuple, float] = {}
+        self.latencies: dict[tuple, float] = {}
+        self.done = hass.loop.create_future()
+
+    def changed(self, identifier: tuple, entity_id: str, now: float) -> None:
+        pending = self.pending.get(identifier)
+        if pending is None or entity_id not in pending:
+            return
+        pending.discard(entity_id)
+        if pending:
+            return
+        self.latencies[identifier] = now - self.sent_at[identifier]
+        del self.pending[identifier]
+        if not self.pending and not self.done.done():
+            self.done.set_result(None)
+
+
+def inject(manager, frames: list[tuple[tuple, bytes]], round_: Round, rate: float) -> None:
+    """Feed the frames to the manager like the broker's receive thread, at `rate` frames/s (0: no pacing)."""
+    from custom_components.higoal.client.mq import Message
+
+    interval = 1 / rate if rate else 0.0
+    next_at = time.perf_counter()
+    for identifier, data in frames:
+        if interval:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_at += interval
+        message = Message(data)
+        started = round_.sent_at[identifier] = time.perf_counter()
+        manager.on_receive(message)
+        round_.client[identifier] = time.perf_counter() - started
+
+
+async def run(entity_count: int, rounds: int, rate: float) -> Result:
+    from homeassistant import loader
+    from homeassistant.const import EVENT_STATE_CHANGED
+    from homeassistant.core import callback
+    from homeassistant.helpers import entity_registry as er
+    from pytest_homeassistant_custom_component.common import MockConfigEntry, async_test_home_assistant
+
+    from custom_components.higoal.client.device import TYPE_DIMMER, TYPE_SWITCH, DeviceRepository
+    from custom_components.higoal.client.manager import Manager, UnknownDevice
+    from custom_components.higoal.const import DOMAIN
+
+    payloads = device_payloads(-(-entity_count // BUTTONS))
+
+    def refresh(self):
+        self.mq = FakeBroker()
+
+    with (
+        patch.object(DeviceRepository, "get_device_records", lambda self: payloads),
+        patch.object(Manager, "refresh", refresh),
+        tempfile.TemporaryDirectory() as config_dir,
+    ):
+        async with async_test_home_assistant(config_dir=config_dir) as hass:
+            hass.data.pop(loader.DATA_CUSTOM_COMPONENTS)  # the test harness disables custom integrations
+            entry = MockConfigEntry(domain=DOMAIN, data={"username": "bench", "password": "bench"})
+            entry.add_to_hass(hass)
+            assert await hass.config_entries.async_setup(entry.entry_id)
+            await hass.async_block_till_done()
+            manager = entry.runtime_data.manager
+
+            registry = er.async_get(hass)
+            platforms = {TYPE_SWITCH: "switch", TYPE_DIMMER: "light"}
+            devices: dict[tuple, set[str]] = {}
+            owners: dict[str, tuple] = {}
+            for device in manager.device_map.values():
+                if device is UnknownDevice:
+                    continue
+                for entity in device.entities:
+                    if len(owners) == entity_count:
+                        break
+                    entity_id = registry.async_get_entity_id(
+                        platforms[entity.type], DOMAIN, f"higoal:{device.id}:{entity.id}"
+                    )
+                    devices.setdefault(device.identifier, set()).add(entity_id)
+                    owners[entity_id] = device.identifier
+
+            current: Round | None = None
+
+            @callback
+            def _state_changed(event) -> None:
+                if current is not None and (identifier := owners.get(event.data["entity_id"])) is not None:
+                    current.changed(identifier, event.data["entity_id"], time.perf_counter())
+
+            unsubscribe = hass.bus.async_listen(EVENT_STATE_CHANGED, _state_changed)
+
+            # The first round gives every entity its first state and is not measured
+            end_to_end: list[float] = []
+            client: list[float] = []
+            elapsed = 0.0
+            for index in range(rounds + 1):
+                current = Round(hass, devices)
+                frames = [(identifier, status_frame(identifier, index % 2 == 0)) for identifier in devices]
+                started = time.perf_counter()
+                await asyncio.gather(
+                    hass.async_add_executor_job(inject, manager, frames, current, rate),
+                    asyncio.wait_for(current.done, ROUND_TIMEOUT),
+                )
+                if index == 0:
+                    continue
+                elapsed += time.perf_counter() - started
+                for identifier, latency in current.latencies.items():
+                    end_to_end.append(latency)
+                    client.append(current.client[identifier])
+
+            unsubscribe()
+            assert await hass.config_entries.async_unload(entry.entry_id)
+            await hass.async_block_till_done()
+            return Result(entities=len(owners), devices=len(devices), frames=len(end_to_end),
+                          elapsed=elapsed, end_to_end=end_to_end, client=client)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--rounds", type=int, default=5, help="measured rounds of one frame per device")
+    parser.add_argument("--rate", type=float, default=0.0, help="frames/s to inject, 0 for as fast as possible")
+    args = parser.parse_args()
+    sys.path.insert(0, str(ROOT))
+
+    try:
+        import pytest_homeassistant_custom_component  # noqa: F401
+    except ImportError:
+        parser.exit(1, "pytest-homeassistant-custom-component is not installed\n")
+
+    print(f"{'entities':>8} {'devices':>7} {'frames':>6} {'frames/s':>9}  "
+          f"{'end-to-end p50/p99 ms':>21}  {'client p50/p99 ms':>17}  {'HA p50/p99 ms':>15}")
+    for entity_count in args.entities:
+        result = asyncio.run(run(entity_count, args.rounds, args.rate))
+        columns = [
+            f"{percentile(samples, 0.5) * 1000:.2f}/{percentile(samples, 0.99) * 1000:.2f}"
+            for samples in (result.end_to_end, result.client, result.home_assistant)
+        ]
+        print(f"{result.entities:>8} {result.devices:>7} {result.frames:>6} {result.rate:>9.0f}  "
+              f"{columns[0]:>21}  {columns[1]:>17}  {columns[2]:>15}")
+        if result.client:
+            share = statistics.fmean(result.client) / statistics.fmean(result.end_to_end)
+            print(f"{'':>8} client share of the mean end-to-end latency: {share:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measure how much the integration adds to Home Assistant's bootstrap.
+
+Two numbers are reported:
+
+* import time: cumulative `-X importtime` of the integration modules, each measured
+  in a fresh interpreter on top of the Home Assistant core modules, plus the heavy
+  client modules that importing it pulled in.
+* setup time: how long `async_setup_entry` takes to return with simulated cloud
+  latencies, compared with doing login, device fetch and broker connect serially.
+  This part needs `pytest-homeassistant-custom-component` and is skipped without it.
+
+Usage: python scripts/benchmark_startup.py [--runs 5] [--login-latency 0.5] [--connect-latency 2.0]
+"""
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = [
+    "custom_components.higoal",
+    "custom_components.higoal.config_flow",
+    "custom_components.higoal.client.manager",
+]
+# Already imported by Home Assistant before any integration loads, so not attributed to us.
+PRELOADED = (
+    "homeassistant.core, homeassistant.config_entries, homeassistant.helpers.config_validation, "
+    "homeassistant.helpers.entity_platform, homeassistant.helpers.storage"
+)
+HEAVY_MODULES = [
+    "requests",
+    "custom_components.higoal.client.manager",
+    "custom_components.higoal.client.mq",
+    "custom_components.higoal.client.api",
+    "custom_components.higoal.client.utils",
+]
+
+
+def import_time(module: str, runs: int) -> float:
+    """Median cumulative import time of `module` in microseconds."""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {PRELOADED}; import {module}"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        for line in result.stderr.splitlines():
+            parts = [part.strip() for part in line.removeprefix("import time:").split("|")]
+            if len(parts) == 3 and parts[2] == module:
+                samples.append(int(parts[1]))
+    return statistics.median(samples)
+
+
+def loaded_heavy_modules(module: str) -> list[str]:
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+async def setup_time(login_latency: float, connect_latency: float) -> float | None:
+    try:
+        from pytest_homeassistant_custom_component.common import (
+            MockConfigEntry,
+            async_test_home_assistant,
+        )
+    except ImportError:
+        return None
+
+    from homeassistant import loader
+
+    from custom_components.higoal.client.manager import Manager
+    from custom_components.higoal.const import DOMAIN
+
+    def get_devices(self):
+        time.sleep(login_latency)
+        return [], []
+
+    def refresh(self):
+        time.sleep(connect_latency)
+
+    with (
+        patch.object(Manager, "get_devices", get_devices),
+        patch.object(Manager, "refresh", refresh),
+        tempfile.TemporaryDirectory() as config_dir,
+    ):
+        async with async_test_home_assistant(config_dir=config_dir) as hass:
+            hass.data.pop(loader.DATA_CUSTOM_COMPONENTS)  # the test harness disables custom integrations
+            entry = MockConfigEntry(domain=DOMAIN, data={"username": "bench", "password": "bench"})
+            entry.add_to_hass(hass)
+            started = time.perf_counter()
+            assert await hass.config_entries.async_setup(entry.entry_id)
+            elapsed = time.perf_counter() - started
+            await hass.config_entries.async_unload(entry.entry_id)
+            await hass.async_block_till_done()
+            return elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--login-latency", type=float, default=0.5)
+    parser.add_argument("--connect-latency", type=float, default=2.0)
+    args = parser.parse_args()
+    sys.path.insert(0, str(ROOT))
+
+    print("import time (median of %d runs)" % args.runs)
+    for module in MODULES:
+        print(f"  {module:45} {import_time(module, args.runs) / 1000:8.1f} ms")
+    print(f"  heavy modules loaded by the integration: {loaded_heavy_modules(MODULES[0]) or 'none'}")
+
+    elapsed = asyncio.run(setup_time(args.login_latency, args.connect_latency))
+    if elapsed is None:
+        print("setup time: skipped (pytest-homeassistant-custom-component is not installed)")
+        return
+    serial = args.login_latency + args.connect_latency
+    print(f"setup time: {elapsed * 1000:.1f} ms (serial login + connect would be {serial * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
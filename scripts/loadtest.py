@@ -0,0 +1,288 @@
+"""
+Load-test the client Manager with synthetic devices.
+
+For each requested device count a Manager is built from synthetic
+`Device.init_from` payloads that cycle through every device type in
+`client.utils.models` and a set of button layouts (switches, dimmers, shutter
+pairs, mixed, layouts with unused slots). The cloud API and the socket are
+replaced by fakes, so only the client code is measured. Status frames are fed
+through a fake broker at a fixed rate (or as fast as possible), optionally
+mixed with outbound commands.
+
+Reported per device count:
+
+* frames/s actually sustained, and whether that kept up with the requested rate
+* on_receive latency percentiles
+* memory per device (devices, entities and their first status, via tracemalloc)
+* listener callback counts and frames sent back to the broker (commands and offline probes)
+
+Offline devices are probed on every received frame by default, which dominates
+at large device counts; compare with --offline-probe-interval.
+
+Usage: python scripts/loadtest.py [--devices 10 100 1000 10000] [--frames 20000] [--rate 0]
+                                  [--offline-ratio 0.05] [--command-ratio 0.01] [--history-size 0]
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# The client package has no Home Assistant dependency; import it on its own so the
+# load test runs without Home Assistant installed.
+CLIENT_ROOT = Path(__file__).resolve().parent.parent / "custom_components" / "higoal"
+sys.path.insert(0, str(CLIENT_ROOT))
+
+from client.device import (  # noqa: E402
+    _FALLBACK_PERCENTAGE_OFFSET,
+    _OFF_VALUE,
+    _OFFLINE_VALUE,
+    _ON_VALUE,
+    _PERCENTAGE_FLAG_OFFSET,
+    _PERCENTAGE_OFFSET,
+    _STATUS_OFFSET,
+    ACTION_TURN_OFF,
+    ACTION_TURN_ON,
+    TYPE_DIMMER,
+    TYPE_SHUTTER,
+    TYPE_SWITCH,
+)
+from client.manager import EntityListener, Manager  # noqa: E402
+from client.mq import MESSAGE_SIZE, STATUS_HEADER, STATUS_IDENTIFIER, Message  # noqa: E402
+from client.utils import models  # noqa: E402
+
+# Number of buttons of each model. The cloud does not report it, so this follows the model names.
+BUTTONS = {"8B": 8, "6B": 6, "PT": 4, "2B": 2, "4B": 4, "2R": 2, "SOCKET": 1, "IR": 1, "PIMA": 1, "C4": 4}
+
+# Button layouts as (name, type) per slot, cut to the number of buttons of the model. Type 0 is an unused slot.
+LAYOUTS = {
+    "switches": [("switch", TYPE_SWITCH)] * 8,
+    "dimmers": [("dimmer", TYPE_DIMMER)] * 8,
+    "shutters": [("shutter", TYPE_SHUTTER), ("", TYPE_SHUTTER)] * 4,
+    "mixed": [("switch", TYPE_SWITCH), ("dimmer", TYPE_DIMMER), ("shutter", TYPE_SHUTTER), ("", TYPE_SHUTTER)] * 2,
+    "sparse": [("switch", TYPE_SWITCH), ("", 0)] * 4,
+}
+STATUSES = (_ON_VALUE, _OFF_VALUE)
+
+
+def device_payloads(count: int, seed: int = 0) -> list[dict]:
+    """Raw device records as returned by the cloud, cycling through every model type and layout."""
+    rng = random.Random(seed)
+    combinations = [(device_type, layout) for device_type in models for layout in LAYOUTS]
+    payloads = []
+    for index in range(count):
+        device_type, layout = combinations[index % len(combinations)]
+        buttons = LAYOUTS[layout][:BUTTONS[models[device_type]]]
+        payloads.append({
+            "id": str(10_000_000 + index),  # numeric ids are valid in the custom encoding
+            "type": device_type,
+            "name": f"{models[device_type]} {layout} {index}",
+            "roomId": f"room-{index // 8}",
+            "homeId": f"home-{index // 500}",
+            "ssid": "loadtest",
+            "mac": f"{rng.getrandbits(48):012x}",
+            "version": "1.0",
+            "buttonName": ";".join(name for name, _ in buttons) + ";",
+            "buttonType": ",".join(str(button_type) for _, button_type in buttons),
+        })
+    return payloads
+
+
+def status_frame(identifier: tuple, statuses: list[int], percentages: list[int]) -> Message:
+    data = bytearray(MESSAGE_SIZE)
+    data[0], data[1] = STATUS_HEADER
+    data[STATUS_IDENTIFIER] = bytes(identifier)
+    for index, (status, percentage) in enumerate(zip(statuses, percentages, strict=True)):
+        base = _STATUS_OFFSET + index
+        data[base] = status
+        data[base + _PERCENTAGE_FLAG_OFFSET] = 1
+        data[base + _PERCENTAGE_OFFSET] = percentage
+        data[base + _FALLBACK_PERCENTAGE_OFFSET] = percentage
+    return Message(bytes(data))
+
+
+class CountingListener(EntityListener):
+    def __init__(self):
+        self.entity_changed = 0
+        self.device_added = 0  # only devices discovered through frames of unknown devices
+        self.device_removed = 0
+
+    def on_entity_changed(self, entity):
+        self.entity_changed += 1
+
+    def on_device_added(self, device):
+        self.device_added += 1
+
+    def on_device_removed(self, device):
+        self.device_removed += 1
+
+
+class FakeBroker:
+    """Stands in for MessageBroker: delivers frames to its handlers and counts what is sent."""
+
+    def __init__(self):
+        self.handlers = []
+        self.connected = True
+        self.sent = 0
+
+    def add_message_handler(self, handler) -> None:
+        self.handlers.append(handler)
+
+    def deliver(self, message: Message) -> None:
+        for handler in self.handlers:
+            handler.on_receive(message)
+
+    def send_message(self, message: Message) -> bool:
+        self.sent += 1
+        return True
+
+    def send_messages(self, messages, interval=None) -> int:
+        self.sent += len(messages)
+        return len(messages)
+
+    def stop(self, timeout=None) -> bool:
+        self.connected = False
+        return True
+
+
+def build_manager(payloads: list[dict], listener: EntityListener, history_size: int,
+                  offline_probe_interval: float) -> tuple[Manager, FakeBroker]:
+    manager = Manager(username="loadtest", password="loadtest", entity_listener=listener,
+                      history_size=history_size, offline_probe_interval=offline_probe_interval)
+    # Fake the cloud: no sign in, the device list comes from the synthetic payloads.
+    manager.api.sign_in = lambda: None
+    manager.device_repository.get_device_records = lambda: payloads
+    manager.get_devices()
+    broker = FakeBroker()
+    broker.add_message_handler(manager)
+    manager.mq = broker
+    return manager, broker
+
+
+@dataclass
+class Result:
+    devices: int
+    entities: int
+    frames: int
+    elapsed: float
+    requested_rate: float
+    latencies: list[float] = field(repr=False)
+    memory_per_device: float
+    entity_changed: int
+    device_added: int
+    device_removed: int
+    frames_sent: int
+    commands: int
+
+    @property
+    def rate(self) -> float:
+        return self.frames / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def run(device_count: int, frames: int, rate: float, offline_ratio: float, command_ratio: float,
+        history_size: int, offline_probe_interval: float, seed: int) -> Result:
+    rng = random.Random(seed)
+    payloads = device_payloads(device_count, seed)
+
+    # Memory: everything the manager keeps per device, up to and including the first status.
+    listener = CountingListener()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    manager, broker = build_manager(payloads, listener, history_size, offline_probe_interval)
+    devices = list(manager.device_map.values())
+    offline = set(rng.sample(range(len(devices)), int(len(devices) * offline_ratio)))
+    for index, device in enumerate(devices):
+        broker.deliver(_random_frame(rng, device, index in offline))
+    memory_per_device = (tracemalloc.get_traced_memory()[0] - before) / max(1, device_count)
+    tracemalloc.stop()
+
+    entities = [entity for device in devices for entity in device.entities]
+    messages = [_random_frame(rng, devices[rng.randrange(len(devices))], False) for _ in range(min(frames, 4096))]
+    for index in offline:
+        messages[rng.randrange(len(messages))] = _random_frame(rng, devices[index], True)
+
+    latencies = []
+    commands = 0
+    interval = 1 / rate if rate > 0 else 0.0
+    started = time.perf_counter()
+    for index in range(frames):
+        if interval:
+            delay = started + index * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        message = messages[index % len(messages)]
+        received = time.perf_counter()
+        broker.deliver(message)
+        latencies.append(time.perf_counter() - received)
+
+        if command_ratio and rng.random() < command_ratio:
+            commands += 1
+            action = rng.choice((ACTION_TURN_ON, ACTION_TURN_OFF))
+            if rng.random() < 0.5:
+                manager.send_command(rng.choice(entities).command_for(action))
+            else:
+                manager.send_bulk([(entity, action) for entity in rng.sample(entities, min(8, len(entities)))])
+    elapsed = time.perf_counter() - started
+
+    manager.stop()
+    return Result(
+        devices=device_count,
+        entities=len(entities),
+        frames=frames,
+        elapsed=elapsed,
+        requested_rate=rate,
+        latencies=latencies,
+        memory_per_device=memory_per_device,
+        entity_changed=listener.entity_changed,
+        device_added=listener.device_added,
+        device_removed=listener.device_removed,
+        frames_sent=broker.sent,
+        commands=commands,
+    )
+
+
+def _random_frame(rng: random.Random, device, offline: bool) -> Message:
+    slots = max((entity.id for entity in device.entities), default=0) + 1
+    statuses = [rng.choice(STATUSES) for _ in range(slots)]
+    if offline:
+        statuses[0] = _OFFLINE_VALUE
+    percentages = [rng.randrange(101) for _ in range(slots)]
+    return status_frame(device.identifier, statuses, percentages)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--frames", type=int, default=20000, help="status frames fed per device count")
+    parser.add_argument("--rate", type=float, default=0, help="frames per second, 0 for as fast as possible")
+    parser.add_argument("--offline-ratio", type=float, default=0.05, help="share of devices that report offline")
+    parser.add_argument("--command-ratio", type=float, default=0.01, help="commands sent per received frame")
+    parser.add_argument("--history-size", type=int, default=0, help="see Manager(history_size=...)")
+    parser.add_argument("--offline-probe-interval", type=float, default=0.0,
+                        help="see Manager(offline_probe_interval=...)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    header = (f"{'devices':>8} {'entities':>8} {'frames/s':>10} {'p50 us':>8} {'p99 us':>8} {'max us':>9} "
+              f"{'KiB/dev':>8} {'changed':>8} {'added':>6} {'removed':>7} {'sent':>8} {'cmds':>6}")
+    print(header)
+    for device_count in args.devices:
+        result = run(device_count, args.frames, args.rate, args.offline_ratio, args.command_ratio,
+                     args.history_size, args.offline_probe_interval, args.seed)
+        kept_up = "" if not args.rate or result.rate >= args.rate * 0.99 else "  (behind requested rate)"
+        print(f"{result.devices:8d} {result.entities:8d} {result.rate:10.0f} "
+              f"{result.percentile(0.5) * 1e6:8.1f} {result.percentile(0.99) * 1e6:8.1f} "
+              f"{max(result.latencies, default=0) * 1e6:9.1f} {result.memory_per_device / 1024:8.2f} "
+              f"{result.entity_changed:8d} {result.device_added:6d} {result.device_removed:7d} {result.frames_sent:8d} "
+              f"{result.commands:6d}{kept_up}")
+
+
+if __name__ == "__main__":
+    main()